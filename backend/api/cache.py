@@ -0,0 +1,183 @@
+import hashlib
+import threading
+import time
+from collections import Counter
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.base import BaseCache
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import parse_etags
+
+from .renderers import ORJSONRenderer
+
+
+def get_version(namespace):
+    """Текущая версия данных пространства имён кэша.
+
+    Начальное значение берётся от времени, чтобы после вытеснения ключа
+    версия не совпала со старой.
+    """
+    key = f'{namespace}:version'
+    cache.add(key, time.time_ns(), None)
+    return cache.get(key)
+
+
+def bump_version(namespace):
+    """Сбросить все записи пространства имён кэша."""
+    incr_counter(f'{namespace}:version', time.time_ns())
+
+
+def has_atomic_incr(backend):
+    """incr бэкенда атомарен, а не get и set из BaseCache."""
+    return type(backend).incr is not BaseCache.incr
+
+
+def incr_counter(key, initial, delta=1):
+    """Увеличить счётчик без срока жизни на delta, вернуть новое значение.
+
+    Отсутствующий счётчик начинается с initial.
+    """
+    cache.add(key, initial, None)
+    try:
+        value = cache.incr(key, delta)
+    except ValueError:
+        # Ключ вытеснен между add и incr.
+        cache.set(key, initial + delta, None)
+        return initial + delta
+    if not has_atomic_incr(caches['default']):
+        # BaseCache.incr перезаписывает ключ со сроком TIMEOUT.
+        cache.touch(key, None)
+    return value
+
+
+def normalize_params(query_params, ignored=()):
+    """Параметры запроса в виде, не зависящем от их порядка."""
+    return sorted((name, sorted(values))
+                  for name, values in query_params.lists()
+                  if name not in ignored)
+
+
+def params_hash(query_params, ignored=()):
+    params = normalize_params(query_params, ignored)
+    return hashlib.md5(repr(params).encode()).hexdigest()
+
+
+class HitCounter:
+    """Попадания и промахи кэша ответов (команда cache_stats).
+
+    Считаются в памяти процесса и добавляются к счётчикам в кэше не
+    чаще раза в CACHE_STATS_FLUSH_INTERVAL секунд. На бэкенде без
+    атомарного incr не сохраняются: параллельные сложения теряются.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = Counter()
+        self._flushed_at = time.monotonic()
+
+    def record(self, namespace, hit):
+        with self._lock:
+            self._counts[f'{namespace}:{"hits" if hit else "misses"}'] += 1
+            now = time.monotonic()
+            if now - self._flushed_at < settings.CACHE_STATS_FLUSH_INTERVAL:
+                return
+            counts = dict(self._counts)
+            self._counts.clear()
+            self._flushed_at = now
+        if has_atomic_incr(caches['default']):
+            for key, count in counts.items():
+                incr_counter(key, 0, count)
+
+
+hit_counter = HitCounter()
+
+
+def cached_json_response(request, namespace, key, get_data,
+                         timeout=settings.REFERENCE_CACHE_TIMEOUT,
+                         max_age=None):
+    """Ответ с готовыми байтами JSON из кэша и поддержкой If-None-Match.
+
+    При max_age ответ помечается Cache-Control: public, чтобы его мог
+    кэшировать и nginx.
+    """
+    cache_key = f'{namespace}:{get_version(namespace)}:{key}'
+    entry = cache.get(cache_key)
+    cached = entry is not None
+    hit_counter.record(namespace, cached)
+    if not cached:
+        content = ORJSONRenderer().render(get_data())
+        entry = (content, '"%s"' % hashlib.md5(content).hexdigest())
+        cache.set(cache_key, entry, timeout)
+    content, etag = entry
+    # Сжатый ответ уходит со слабым ETag (W/"..."), сравнение слабое.
+    if_none_match = [
+        tag[2:] if tag.startswith('W/') else tag
+        for tag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', ''))]
+    if etag in if_none_match or '*' in if_none_match:
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(content, content_type='application/json')
+    response['ETag'] = etag
+    response['X-Cache'] = 'HIT' if cached else 'MISS'
+    if max_age is not None:
+        patch_cache_control(response, public=True, max_age=max_age)
+        patch_vary_headers(response, ('Authorization',))
+    return response
+
+
+class CachedReferenceMixin:
+    """list и retrieve справочника из кэша.
+
+    Кэшируется только JSON, версия cache_namespace сбрасывается
+    сигналами при изменении модели и после import_csv.
+    """
+
+    cache_namespace = None
+    cache_timeout = settings.REFERENCE_CACHE_TIMEOUT
+    cache_max_age = None
+
+    def can_cache(self, request):
+        return request.accepted_renderer.format == 'json'
+
+    def get_cache_key(self, request, key):
+        return key
+
+    def cached_response(self, request, key, view):
+        if not self.can_cache(request):
+            return view()
+        return cached_json_response(
+            request, self.cache_namespace, self.get_cache_key(request, key),
+            lambda: view().data, self.cache_timeout, self.cache_max_age)
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(
+            request, 'list', partial(super().list, request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        view = partial(super().retrieve, request, *args, **kwargs)
+        pk = str(kwargs.get(self.lookup_url_kwarg or self.lookup_field))
+        if not pk.isdigit():
+            return view()
+        return self.cached_response(request, pk, view)
+
+
+class AnonymousCacheMixin(CachedReferenceMixin):
+    """list и retrieve из кэша для анонимных пользователей.
+
+    У анонимных флаги is_* всегда ложные, поэтому ответ одинаков для
+    всех и зависит только от параметров запроса. Версию сбрасывают
+    сигналы изменения рецептов, тегов, ингредиентов и пользователей.
+    """
+
+    cache_timeout = settings.RECIPES_CACHE_TIMEOUT
+    cache_max_age = settings.RECIPES_CACHE_MAX_AGE
+
+    def can_cache(self, request):
+        return (not request.user.is_authenticated
+                and super().can_cache(request))
+
+    def get_cache_key(self, request, key):
+        return f'{key}:{params_hash(request.query_params, ("format",))}'
@@ -0,0 +1,18 @@
+from django.core.cache import caches
+from django.core.checks import Tags, Warning, register
+
+from .cache import has_atomic_incr
+
+
+@register(Tags.caches)
+def check_cache_incr(app_configs, **kwargs):
+    """Версии и счётчики кэша требуют атомарного incr."""
+    backend = caches['default']
+    if has_atomic_incr(backend):
+        return []
+    return [Warning(
+        f'{type(backend).__name__} увеличивает счётчики через get и set, '
+        'параллельные сбросы версий и счётчики cache_stats теряются.',
+        hint='Используйте Memcached или Redis (CACHE_LOCATION).',
+        id='api.W001',
+    )]
@@ -0,0 +1,140 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections, transaction
+
+from recipes.models import Recipe
+from users.models import Following, User
+
+logger = logging.getLogger(__name__)
+
+executor = ThreadPoolExecutor(
+    max_workers=max(settings.FEED_FANOUT_WORKERS, 1),
+    thread_name_prefix='feed-fan-out',
+)
+
+
+def feed_key(user_id):
+    return f'feed:{user_id}'
+
+
+def is_fan_out_author(author):
+    """Рецепты автора раскладываются по лентам подписчиков при записи."""
+    return author.followers_count <= settings.FEED_FANOUT_MAX_FOLLOWERS
+
+
+def followed_recipes(user, fan_out):
+    """Рецепты авторов из подписок с раскладкой (fan_out) или без неё."""
+    max_followers = settings.FEED_FANOUT_MAX_FOLLOWERS
+    recipes = Recipe.objects.filter(author__following__user=user)
+    if fan_out:
+        return recipes.filter(author__followers_count__lte=max_followers)
+    return recipes.filter(author__followers_count__gt=max_followers)
+
+
+def update_follower_feeds(author_id, update):
+    """Заменить закэшированные ленты подписчиков автора на update(ids).
+
+    Ленты, которых нет в кэше, не создаются - они соберутся из БД при
+    чтении.
+    """
+    followers = Following.objects.filter(
+        following_id=author_id).values_list('user_id', flat=True)
+    followers = followers.iterator()
+    while True:
+        keys = [feed_key(user_id) for user_id in islice(followers, 1000)]
+        if not keys:
+            return
+        feeds = cache.get_many(keys)
+        cache.set_many({key: update(ids) for key, ids in feeds.items()},
+                       settings.FEED_CACHE_TIMEOUT)
+
+
+def get_fan_out_author(author_id):
+    """Автор, если его рецепты раскладываются по лентам, иначе None."""
+    author = User.objects.filter(id=author_id).only(
+        'id', 'followers_count').first()
+    if author is None or not is_fan_out_author(author):
+        return None
+    return author
+
+
+def fan_out_recipe(recipe_id, author_id):
+    """Добавить новый рецепт в начало закэшированных лент подписчиков.
+
+    Авторы с большим числом подписчиков пропускаются, их рецепты
+    подмешиваются при чтении (fan-in). Лента могла собраться из БД уже
+    с этим рецептом, поэтому он не добавляется повторно.
+    """
+    if get_fan_out_author(author_id) is None:
+        return
+    update_follower_feeds(author_id, lambda ids: [
+        recipe_id, *(pk for pk in ids if pk != recipe_id)
+    ][:settings.FEED_CACHE_SIZE])
+
+
+def remove_from_feeds(recipe_id, author_id):
+    """Убрать удалённый рецепт из закэшированных лент подписчиков.
+
+    Рецепты авторов без раскладки в ленты не попадают. Если автор
+    удалён, его подписки тоже удалены и ленты уже сброшены.
+    """
+    if get_fan_out_author(author_id) is None:
+        return
+    update_follower_feeds(
+        author_id, lambda ids: [pk for pk in ids if pk != recipe_id])
+
+
+def run_in_worker(function, *args):
+    try:
+        function(*args)
+    except Exception:
+        logger.exception('Не удалось обновить ленты подписчиков')
+    finally:
+        connections.close_all()
+
+
+def schedule_feed_update(function, *args):
+    """Выполнить function(*args) после коммита в фоновом потоке.
+
+    При FEED_FANOUT_WORKERS = 0 - в текущем потоке.
+    """
+    if not settings.FEED_FANOUT_WORKERS:
+        transaction.on_commit(lambda: function(*args))
+    else:
+        transaction.on_commit(
+            lambda: executor.submit(run_in_worker, function, *args))
+
+
+def get_cached_feed(user):
+    """Последние FEED_CACHE_SIZE id рецептов ленты с раскладкой."""
+    ids = cache.get(feed_key(user.id))
+    if ids is None:
+        ids = list(followed_recipes(user, fan_out=True).order_by(
+            '-id').values_list('id', flat=True)[:settings.FEED_CACHE_SIZE])
+        cache.set(feed_key(user.id), ids, settings.FEED_CACHE_TIMEOUT)
+    return ids
+
+
+def get_feed_ids(user, before=None, limit=6):
+    """До limit + 1 id рецептов ленты по убыванию, меньше before.
+
+    Лишний id показывает, что есть следующая страница. Страницы за
+    пределами закэшированного окна читаются из БД.
+    """
+    cached = get_cached_feed(user)
+    ids = [pk for pk in cached if before is None or pk < before]
+    ids = ids[:limit + 1]
+    regular = followed_recipes(user, fan_out=True)
+    popular = followed_recipes(user, fan_out=False)
+    if before is not None:
+        regular = regular.filter(id__lt=before)
+        popular = popular.filter(id__lt=before)
+    if len(ids) <= limit and len(cached) >= settings.FEED_CACHE_SIZE:
+        ids = list(regular.order_by('-id').values_list(
+            'id', flat=True)[:limit + 1])
+    ids += popular.order_by('-id').values_list('id', flat=True)[:limit + 1]
+    return sorted(set(ids), reverse=True)[:limit + 1]
@@ -1,20 +1,74 @@
-from django_filters.rest_framework import (FilterSet,
+from collections import defaultdict
+
+from django.conf import settings
+from django.db.models import Case, Exists, IntegerField, OuterRef, Value, When
+from django_filters.rest_framework import (CharFilter, ChoiceFilter, FilterSet,
                                            ModelMultipleChoiceFilter,
                                            NumberFilter)
 from rest_framework import filters
+from rest_framework.exceptions import ValidationError
+
+from recipes.models import Favorite, Recipe, Tag, UserShoppingCart
+from recipes.search import search_recipes
+from .recipe_index import recipe_ingredient_index
 
-from recipes.models import Recipe, Tag
+# Значения ?ordering= для рецептов и поля сортировки.
+RECIPE_ORDERINGS = {
+    'popular': ('-popularity', '-id'),
+    'new': ('-id',),
+    'quick': ('cooking_time', '-id'),
+    'favorites': ('-favorites_count', '-id'),
+}
 
 
 class RecipeFilter(FilterSet):
-    """Фильтрация по тегам списка рецептов."""
+    """Фильтрация по тегам списка рецептов.
+
+    Теги проверяются подзапросом EXISTS, поэтому рецепт попадает в выдачу
+    один раз без DISTINCT. tags_mode=all оставляет рецепты со всеми
+    переданными тегами, по умолчанию (any) - хотя бы с одним.
+    have=1,2,3 - рецепты хотя бы с одним из ингредиентов, сначала те,
+    которым хватает переданных, затем по числу недостающих
+    (api.recipe_index). Применяется после остальных фильтров, и лучшие
+    RECIPES_HAVE_LIMIT выбираются среди уже отобранных рецептов (не
+    дальше RECIPES_HAVE_SCAN_LIMIT лучших по индексу).
+    search ищет по названию, описанию и ингредиентам с сортировкой по
+    релевантности (recipes.search), если не задан ordering.
+    ordering: popular - по популярности (recipes.ranking), new - сначала
+    новые, quick - по времени приготовления, favorites - по счётчику
+    избранного.
+    """
 
     tags = ModelMultipleChoiceFilter(
         field_name='tags__slug',
         to_field_name='slug',
-        queryset=Tag.objects.all()
+        queryset=Tag.objects.all(),
+        method='filter_tags',
+    )
+
+    tags_mode = ChoiceFilter(
+        choices=(('any', 'any'), ('all', 'all')),
+        method='filter_tags_mode',
+    )
+
+    search = CharFilter(method='filter_search')
+
+    have = CharFilter(method='filter_have')
+
+    ordering = ChoiceFilter(
+        choices=[(value, value) for value in RECIPE_ORDERINGS],
+        method='filter_ordering',
     )
 
+    cooking_time_min = NumberFilter(field_name='cooking_time',
+                                    lookup_expr='gte')
+    cooking_time_max = NumberFilter(field_name='cooking_time',
+                                    lookup_expr='lte')
+    ingredients_count_min = NumberFilter(field_name='ingredients_count',
+                                         lookup_expr='gte')
+    ingredients_count_max = NumberFilter(field_name='ingredients_count',
+                                         lookup_expr='lte')
+
     is_favorited = NumberFilter(
         method='get_is_favorited')
 
@@ -25,23 +79,124 @@ class RecipeFilter(FilterSet):
     class Meta:
         model = Recipe
         fields = (
-            'is_in_shopping_cart', 'is_favorited', 'tags', 'author',
+            'is_in_shopping_cart', 'is_favorited', 'tags', 'tags_mode',
+            'author', 'cooking_time_min', 'cooking_time_max',
+            'ingredients_count_min', 'ingredients_count_max', 'search',
+            'have', 'ordering',
         )
 
+    def filter_tags(self, queryset, name, value):
+        if not value:
+            return queryset
+        recipe_tags = Recipe.tags.through.objects.filter(
+            recipe=OuterRef('pk'))
+        if self.form.cleaned_data.get('tags_mode') != 'all':
+            return queryset.filter(Exists(recipe_tags.filter(tag__in=value)))
+        for tag in value:
+            queryset = queryset.filter(Exists(recipe_tags.filter(tag=tag)))
+        return queryset
+
+    def filter_tags_mode(self, queryset, name, value):
+        return queryset
+
+    def filter_search(self, queryset, name, value):
+        value = value.strip()
+        if not value:
+            return queryset
+        return search_recipes(queryset, value)
+
+    def filter_have(self, queryset, name, value):
+        # Применяется в filter_queryset после остальных фильтров.
+        return queryset
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        value = self.form.cleaned_data.get('have')
+        if not value:
+            return queryset
+        return self.rank_by_ingredients(queryset, 'have', value)
+
+    def rank_by_ingredients(self, queryset, name, value):
+        ids = [pk.strip() for pk in value.split(',') if pk.strip()]
+        if not ids:
+            return queryset
+        if not all(pk.isdigit() for pk in ids):
+            raise ValidationError(
+                {name: 'Ожидается список id ингредиентов через запятую.'})
+        ranked = self.top_ranked(queryset, list(map(int, ids)))
+        by_missing = defaultdict(list)
+        for recipe_id, missing in ranked:
+            by_missing[missing].append(recipe_id)
+        queryset = queryset.filter(
+            id__in=[recipe_id for recipe_id, _ in ranked]
+        ).annotate(missing_ingredients=Case(
+            *(When(id__in=recipe_ids, then=Value(missing))
+              for missing, recipe_ids in by_missing.items()),
+            default=Value(0),
+            output_field=IntegerField(),
+        ))
+        if self.form.cleaned_data.get('ordering'):
+            return queryset
+        return queryset.order_by('missing_ingredients', '-id')
+
+    def top_ranked(self, queryset, ingredient_ids):
+        """Лучшие RECIPES_HAVE_LIMIT по индексу среди рецептов queryset.
+
+        Если запрос отфильтрован, из индекса берётся всё больше лучших
+        рецептов, пока среди них не наберётся RECIPES_HAVE_LIMIT
+        прошедших фильтры (проверка id__in в SQL). Дальше
+        RECIPES_HAVE_SCAN_LIMIT лучших поиск не идёт.
+        """
+        limit = settings.RECIPES_HAVE_LIMIT
+        size = limit
+        while True:
+            ranked = recipe_ingredient_index.rank(ingredient_ids, size)
+            if not queryset.query.where:
+                return ranked
+            matching = set(queryset.filter(
+                id__in=[recipe_id for recipe_id, _ in ranked]
+            ).order_by().values_list('id', flat=True))
+            selected = [item for item in ranked if item[0] in matching]
+            if (len(selected) >= limit or len(ranked) < size
+                    or size >= settings.RECIPES_HAVE_SCAN_LIMIT):
+                return selected[:limit]
+            size = min(size * 4, settings.RECIPES_HAVE_SCAN_LIMIT)
+
+    def filter_ordering(self, queryset, name, value):
+        return queryset.order_by(*RECIPE_ORDERINGS[value])
+
     def get_is_favorited(self, queryset, name, value):
         user = self.request.user
         if value and not user.is_anonymous:
-            return queryset.filter(favorite__user=user)
+            return queryset.filter(Exists(Favorite.objects.filter(
+                user=user, recipe=OuterRef('pk'))))
         return queryset
 
     def get_is_in_shopping_cart(self, queryset, name, value):
         user = self.request.user
         if value and not user.is_anonymous:
-            return queryset.filter(shopping_cart__user=user)
+            return queryset.filter(Exists(UserShoppingCart.objects.filter(
+                user=user, recipe=OuterRef('pk'))))
         return queryset
 
 
 class IngredientFilter(filters.SearchFilter):
-    """Фильтрация ингредиентов по имени."""
+    """Фильтрация ингредиентов по имени.
+
+    Сначала ингредиенты, начинающиеся с name, затем содержащие его,
+    не больше INGREDIENTS_SEARCH_LIMIT штук.
+    """
 
     search_param = 'name'
+
+    def filter_queryset(self, request, queryset, view):
+        name = request.query_params.get(self.search_param, '').strip()
+        if not name:
+            return queryset
+        return queryset.filter(name__icontains=name).annotate(
+            is_substring=Case(
+                When(name__istartswith=name, then=Value(0)),
+                default=Value(1),
+                output_field=IntegerField(),
+            )
+        ).order_by('is_substring', 'name')[:settings.INGREDIENTS_SEARCH_LIMIT]
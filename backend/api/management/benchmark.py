@@ -0,0 +1,45 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from users.models import User
+
+
+class BenchmarkCommand(BaseCommand):
+    """Основа команд замеров: пользователь из --user и замер времени.
+
+    Команды, которым пользователь не нужен, задают needs_user = False.
+    """
+
+    needs_user = True
+
+    def add_arguments(self, parser):
+        if self.needs_user:
+            parser.add_argument(
+                '--user', type=int, default=None,
+                help='id пользователя (по умолчанию первый).')
+
+    def get_user(self, options):
+        """Пользователь из --user или первый по id."""
+        users = User.objects.order_by('id')
+        if options['user'] is not None:
+            users = users.filter(id=options['user'])
+        user = users.first()
+        if user is None:
+            raise CommandError('Нужен хотя бы один пользователь.')
+        return user
+
+    def measure(self, operation, runs):
+        """Результат последнего вызова и время каждого вызова в мс."""
+        timings = []
+        for _ in range(runs):
+            started = time.perf_counter()
+            result = operation()
+            timings.append((time.perf_counter() - started) * 1000)
+        return result, timings
+
+    def median(self, operation, runs):
+        """Результат последнего вызова и медианное время в мс."""
+        result, timings = self.measure(operation, runs)
+        return result, statistics.median(timings)
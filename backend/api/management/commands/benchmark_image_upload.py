@@ -0,0 +1,77 @@
+import base64
+import io
+import os
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import CommandError
+from PIL import Image
+
+from api.management.benchmark import BenchmarkCommand
+from api.serializers import Base64ImageField
+
+
+class Command(BenchmarkCommand):
+    help = ('Пик памяти и время декодирования параллельных загрузок '
+            'картинок в base64')
+    needs_user = False
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument(
+            '--size-mb', type=float, default=5,
+            help='Примерный размер картинки в мегабайтах.')
+        parser.add_argument(
+            '--concurrency', type=int, nargs='+', default=[1, 4, 8],
+            help='Число одновременных загрузок.')
+
+    def handle(self, *args, **options):
+        data = self.make_data(options['size_mb'])
+        size = len(data) * 3 // 4
+        if size > settings.IMAGE_MAX_SIZE:
+            raise CommandError('Картинка больше IMAGE_MAX_SIZE.')
+        self.stdout.write('Картинка %.1f МБ, base64 %.1f МБ' % (
+            size / 1024 / 1024, len(data) / 1024 / 1024))
+        for concurrency in options['concurrency']:
+            for title, decode in (('частями', self.decode),
+                                  ('целиком', self.decode_whole)):
+                peak, timing = self.benchmark(decode, data, concurrency)
+                self.stdout.write(
+                    '%3d загрузок, %-7s пик %8.1f МБ, %8.2f мс' % (
+                        concurrency, title, peak / 1024 / 1024, timing))
+
+    def make_data(self, size_mb):
+        """data:image/png;base64,... из шума (PNG почти не сжимает)."""
+        side = int((size_mb * 1024 * 1024 / 3) ** 0.5)
+        image = Image.frombytes('RGB', (side, side), os.urandom(
+            side * side * 3))
+        buffer = io.BytesIO()
+        image.save(buffer, 'PNG', compress_level=0)
+        return 'data:image/png;base64,' + base64.b64encode(
+            buffer.getvalue()).decode()
+
+    def decode(self, data):
+        """Декодирование Base64ImageField."""
+        Base64ImageField().decode(data).close()
+
+    def decode_whole(self, data):
+        """Для сравнения: разбор и декодирование всей строки сразу."""
+        header, encoded = data.split(';base64,')
+        with Image.open(io.BytesIO(base64.b64decode(encoded))) as image:
+            image.verify()
+
+    def benchmark(self, decode, data, concurrency):
+        """Пик памяти сверх входных данных (байты) и время (мс)."""
+
+        def upload():
+            with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                for future in [executor.submit(decode, data)
+                               for _ in range(concurrency)]:
+                    future.result()
+
+        tracemalloc.start()
+        _, timings = self.measure(upload, 1)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return peak, timings[0]
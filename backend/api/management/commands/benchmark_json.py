@@ -0,0 +1,48 @@
+import gzip
+
+from django.conf import settings
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory
+
+from api.management.benchmark import BenchmarkCommand
+from api.middleware import brotli
+from api.renderers import ORJSONRenderer
+from api.serializers import RecipeSerializer
+
+from recipes.models import Recipe
+
+
+class Command(BenchmarkCommand):
+    help = 'Скорость JSON-рендереров и сжатия на странице рецептов'
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument(
+            '--limit', type=int, default=100,
+            help='Число рецептов на странице.')
+        parser.add_argument(
+            '--runs', type=int, default=50,
+            help='Сколько раз выполнить каждую операцию.')
+
+    def handle(self, *args, **options):
+        user = self.get_user(options)
+        request = APIRequestFactory().get('/api/recipes/')
+        request.user = user
+        recipes = Recipe.objects.with_user_data(user).order_by(
+            '-id')[:options['limit']]
+        data = RecipeSerializer(
+            recipes, many=True, context={'request': request}).data
+        self.stdout.write(f'Рецептов на странице: {len(data)}')
+        content = JSONRenderer().render(data)
+        operations = [
+            ('json', lambda: JSONRenderer().render(data)),
+            ('orjson', lambda: ORJSONRenderer().render(data)),
+            ('gzip', lambda: gzip.compress(content, compresslevel=6)),
+        ]
+        if brotli is not None:
+            operations.append(('brotli', lambda: brotli.compress(
+                content, quality=settings.COMPRESSION_BROTLI_QUALITY)))
+        for name, operation in operations:
+            result, timing = self.median(operation, options['runs'])
+            self.stdout.write('%-8s %8d байт %8.2f мс %8.1f МБ/с' % (
+                name, len(result), timing, len(content) / timing / 1000))
@@ -0,0 +1,116 @@
+import statistics
+from urllib.parse import parse_qs, urlparse
+
+from django.core.management.base import CommandError
+from django.db import transaction
+from rest_framework.pagination import Cursor
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from api.cache import bump_version
+from api.management.benchmark import BenchmarkCommand
+from api.pagination import IdCursorPagination
+from api.views import RecipeViewSet
+
+from recipes.models import Recipe
+
+
+class FixturePagination(RecipeViewSet.pagination_class):
+    """Количество с временными рецептами кэшируется отдельно от общего."""
+
+    count_cache_namespace = 'benchmark_pagination:recipes_count'
+
+
+class Command(BenchmarkCommand):
+    help = ('Время первой и дальней страницы списка рецептов '
+            'в постраничном и курсорном режимах')
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument(
+            '--pages', type=int, nargs='+', default=[1, 1000],
+            help='Номера страниц.')
+        parser.add_argument(
+            '--limit', type=int, default=6,
+            help='Размер страницы.')
+        parser.add_argument(
+            '--runs', type=int, default=10,
+            help='Сколько раз запросить каждую страницу.')
+        parser.add_argument(
+            '--fixture', type=int, default=0, metavar='N',
+            help='Временно дополнить таблицу рецептов до N строк '
+                 '(транзакция откатывается).')
+        parser.add_argument(
+            '--batch-size', type=int, default=10000,
+            help='Размер пачки при создании рецептов для --fixture.')
+
+    def handle(self, *args, **options):
+        user = self.get_user(options)
+        view_options = {}
+        if options['fixture']:
+            # Иначе количество с откаченными рецептами останется в кэше
+            # и будет отдаваться клиентам.
+            bump_version(FixturePagination.count_cache_namespace)
+            view_options['pagination_class'] = FixturePagination
+        self.view = RecipeViewSet.as_view({'get': 'list'}, **view_options)
+        with transaction.atomic():
+            self.fill(user, options['fixture'], options['batch_size'])
+            self.stdout.write(f'Рецептов: {Recipe.objects.count()}')
+            for page in options['pages']:
+                for mode, params in (
+                        ('page', self.page_params(page)),
+                        ('cursor', self.cursor_params(
+                            page, options['limit']))):
+                    if params is None:
+                        self.stdout.write(
+                            f'{mode:6} страница {page}: нет такой страницы')
+                        continue
+                    params['limit'] = options['limit']
+                    first, median = self.benchmark(
+                        user, params, options['runs'])
+                    self.stdout.write(
+                        '%-6s страница %-6d первый %8.2f мс, '
+                        'медиана %8.2f мс' % (mode, page, first, median))
+            transaction.set_rollback(True)
+
+    def fill(self, user, total, batch_size):
+        """Дополнить рецепты до total строк пачками bulk_create."""
+        missing = total - Recipe.objects.count()
+        while missing > 0:
+            size = min(batch_size, missing)
+            Recipe.objects.bulk_create(
+                Recipe(author=user, name=f'Рецепт {number}', text='',
+                       cooking_time=number % 120 + 1)
+                for number in range(missing - size, missing))
+            missing -= size
+
+    def page_params(self, page):
+        return {'page': page}
+
+    def cursor_params(self, page, limit):
+        """?cursor= на начало страницы page, как по ссылкам next."""
+        if page == 1:
+            return {'cursor': ''}
+        ids = Recipe.objects.order_by('-id').values_list('id', flat=True)
+        position = ids[(page - 1) * limit - 1:(page - 1) * limit]
+        if not position:
+            return None
+        paginator = IdCursorPagination()
+        paginator.base_url = '/api/recipes/'
+        url = paginator.encode_cursor(Cursor(
+            offset=0, reverse=False, position=str(position[0])))
+        return {'cursor': parse_qs(urlparse(url).query)['cursor'][0]}
+
+    def benchmark(self, user, params, runs):
+        """Время первого запроса и медиана, в миллисекундах."""
+
+        def get_page():
+            request = APIRequestFactory().get('/api/recipes/', params)
+            force_authenticate(request, user=user)
+            response = self.view(request)
+            response.render()
+            if response.status_code != 200:
+                raise CommandError(
+                    f'{request.get_full_path()}: {response.status_code}')
+
+        _, timings = self.measure(get_page, runs)
+        return timings[0], statistics.median(timings)
@@ -0,0 +1,61 @@
+from django.core.management.base import CommandError
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from api.management.benchmark import BenchmarkCommand
+from api.views import RecipeViewSet
+
+from recipes.models import Recipe
+
+# Параметры списка рецептов для сравнения представлений.
+LIST_PARAMS = (
+    {},
+    {'expand': 'text,ingredients'},
+    {'fields': 'id,name,image,cooking_time,author.username'},
+)
+
+
+class Command(BenchmarkCommand):
+    help = 'Размер ответа и время запросов рецептов с ?fields= и ?expand='
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument(
+            '--limit', type=int, default=6,
+            help='Размер страницы.')
+        parser.add_argument(
+            '--runs', type=int, default=20,
+            help='Сколько раз выполнить каждый запрос.')
+
+    def handle(self, *args, **options):
+        user = self.get_user(options)
+        recipe = Recipe.objects.order_by('-id').first()
+        if recipe is None:
+            raise CommandError('Нужен хотя бы один рецепт.')
+        cases = [
+            (RecipeViewSet.as_view({'get': 'list'}), '/api/recipes/',
+             {'limit': options['limit'], **params}, {})
+            for params in LIST_PARAMS
+        ]
+        cases.append((
+            RecipeViewSet.as_view({'get': 'retrieve'}),
+            f'/api/recipes/{recipe.id}/', {}, {'pk': recipe.id}))
+        for view, path, params, kwargs in cases:
+            request = APIRequestFactory().get(path, params)
+            size, timing = self.benchmark(
+                view, request, user, kwargs, options['runs'])
+            title = request.get_full_path()
+            self.stdout.write('%8d байт %8.2f мс  %s' % (size, timing, title))
+
+    def benchmark(self, view, request, user, kwargs, runs):
+        """Размер ответа в байтах и медианное время в миллисекундах."""
+        force_authenticate(request, user=user)
+
+        def get():
+            response = view(request, **kwargs)
+            response.render()
+            return response
+
+        response, timing = self.median(get, runs)
+        if response.status_code != 200:
+            raise CommandError(f'{request.path}: {response.status_code}')
+        return len(response.content), timing
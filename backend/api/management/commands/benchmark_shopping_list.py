@@ -0,0 +1,63 @@
+import tracemalloc
+
+from django.db import transaction
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from api.management.benchmark import BenchmarkCommand
+from api.renderers import SHOPPING_LIST_RENDERERS
+from api.views import RecipeViewSet
+
+from recipes.models import Recipe, UserShoppingCart
+
+
+class Command(BenchmarkCommand):
+    help = ('Время, размер и пик памяти выгрузки списка покупок '
+            'во всех форматах')
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument(
+            '--recipes', type=int, default=500,
+            help='Сколько рецептов положить в список покупок.')
+        parser.add_argument(
+            '--runs', type=int, default=5,
+            help='Сколько раз выгрузить каждый формат.')
+
+    def handle(self, *args, **options):
+        user = self.get_user(options)
+        # Список покупок заполняется временно, транзакция откатывается.
+        with transaction.atomic():
+            UserShoppingCart.objects.filter(user=user).delete()
+            UserShoppingCart.objects.bulk_create(
+                UserShoppingCart(user=user, recipe=recipe)
+                for recipe in Recipe.objects.order_by('-id')[
+                    :options['recipes']])
+            self.stdout.write('Рецептов в списке покупок: %d' % (
+                UserShoppingCart.objects.filter(user=user).count()))
+            for renderer in SHOPPING_LIST_RENDERERS:
+                size, timing, peak = self.benchmark(
+                    user, renderer.format, options['runs'])
+                self.stdout.write(
+                    '%-5s %10d байт %8.2f мс %8.1f КБ памяти' % (
+                        renderer.format, size, timing, peak / 1024))
+            transaction.set_rollback(True)
+
+    def benchmark(self, user, file_format, runs):
+        """Размер файла, медианное время (мс) и пик памяти (байты)."""
+        view = RecipeViewSet.as_view(
+            {'get': 'download_shopping_cart'},
+            **RecipeViewSet.download_shopping_cart.kwargs)
+
+        def download():
+            request = APIRequestFactory().get(
+                '/api/recipes/download_shopping_cart/',
+                {'format': file_format})
+            force_authenticate(request, user=user)
+            response = view(request)
+            return sum(len(chunk) for chunk in response.streaming_content)
+
+        tracemalloc.start()
+        size, timing = self.median(download, runs)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return size, timing, peak
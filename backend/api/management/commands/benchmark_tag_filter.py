@@ -0,0 +1,90 @@
+from django.core.management.base import CommandError
+from django.db import transaction
+from django.test import RequestFactory
+
+from api.filters import RecipeFilter
+from api.management.benchmark import BenchmarkCommand
+
+from recipes.models import Recipe, Tag
+
+
+class Command(BenchmarkCommand):
+    help = ('Время фильтра рецептов по тегам (tags_mode=any/all) '
+            'на рецептах с большим числом тегов')
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument(
+            '--recipes', type=int, default=10000,
+            help='Сколько рецептов создать.')
+        parser.add_argument(
+            '--tags', type=int, default=20,
+            help='Сколько тегов создать.')
+        parser.add_argument(
+            '--tags-per-recipe', type=int, default=10,
+            help='Сколько тегов у каждого рецепта.')
+        parser.add_argument(
+            '--filter-tags', type=int, default=5,
+            help='Сколько тегов передать в ?tags=.')
+        parser.add_argument(
+            '--limit', type=int, default=6,
+            help='Размер страницы.')
+        parser.add_argument(
+            '--runs', type=int, default=10,
+            help='Сколько раз выполнить каждый запрос.')
+
+    def handle(self, *args, **options):
+        user = self.get_user(options)
+        # Данные создаются временно, транзакция откатывается.
+        with transaction.atomic():
+            tags = self.fill(user, options)
+            slugs = [tag.slug for tag in tags[:options['filter_tags']]]
+            self.stdout.write(
+                f'Рецептов: {options["recipes"]}, тегов у рецепта: '
+                f'{options["tags_per_recipe"]}, в фильтре: {len(slugs)}')
+            for mode in ('any', 'all'):
+                request = RequestFactory().get(
+                    '/api/recipes/', {'tags': slugs, 'tags_mode': mode})
+                request.user = user
+                filterset = RecipeFilter(
+                    request.GET, queryset=Recipe.objects.all(),
+                    request=request)
+                if not filterset.is_valid():
+                    raise CommandError(filterset.errors)
+                self.report(mode, filterset.qs, options)
+            # Для сравнения: JOIN по тегам с DISTINCT, как было раньше.
+            self.report('join', Recipe.objects.filter(
+                tags__slug__in=slugs).distinct(), options)
+            transaction.set_rollback(True)
+
+    def fill(self, user, options):
+        """Теги и рецепты, у каждого tags_per_recipe тегов подряд."""
+        slugs = [f'benchmark-{number}' for number in range(options['tags'])]
+        if len(slugs) < options['tags_per_recipe']:
+            raise CommandError('--tags меньше --tags-per-recipe.')
+        Tag.objects.bulk_create(
+            Tag(name=slug, slug=slug, color='#000000') for slug in slugs)
+        Recipe.objects.bulk_create(
+            Recipe(author=user, name=f'Рецепт {number}', text='',
+                   cooking_time=1)
+            for number in range(options['recipes']))
+        # bulk_create возвращает id не на всех СУБД, перечитываем.
+        tags = list(Tag.objects.filter(slug__in=slugs).order_by('id'))
+        recipe_ids = Recipe.objects.order_by('-id').values_list(
+            'id', flat=True)[:options['recipes']]
+        Recipe.tags.through.objects.bulk_create(
+            (Recipe.tags.through(recipe_id=recipe_id, tag_id=tags[
+                (number + offset) % len(tags)].pk)
+             for number, recipe_id in enumerate(recipe_ids)
+             for offset in range(options['tags_per_recipe'])),
+            batch_size=10000)
+        return tags
+
+    def report(self, title, queryset, options):
+        """Медианное время страницы и подсчёта, число строк."""
+        page = queryset.order_by('-id')[:options['limit']]
+        _, page_time = self.median(lambda: list(page.all()), options['runs'])
+        _, count_time = self.median(queryset.count, options['runs'])
+        self.stdout.write(
+            '%-4s найдено %8d, страница %8.2f мс, count %8.2f мс' % (
+                title, queryset.count(), page_time, count_time))
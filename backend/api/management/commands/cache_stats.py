@@ -0,0 +1,37 @@
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management.base import BaseCommand
+
+from api.cache import has_atomic_incr
+
+NAMESPACES = ('recipes', 'tags', 'ingredients')
+
+
+class Command(BaseCommand):
+    help = ('Попадания и промахи кэша ответов API (воркеры добавляют их '
+            'раз в CACHE_STATS_FLUSH_INTERVAL секунд)')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--reset', action='store_true',
+            help='Обнулить счётчики после вывода.')
+
+    def handle(self, *args, **options):
+        if isinstance(caches['default'], LocMemCache):
+            self.stderr.write(self.style.WARNING(
+                'Кэш в памяти процесса (LocMemCache): счётчики веб-воркеров '
+                'этой команде не видны.'))
+        elif not has_atomic_incr(caches['default']):
+            self.stderr.write(self.style.WARNING(
+                'incr бэкенда кэша не атомарен, счётчики не сохраняются.'))
+        for namespace in NAMESPACES:
+            hits = cache.get(f'{namespace}:hits', 0)
+            misses = cache.get(f'{namespace}:misses', 0)
+            total = hits + misses
+            ratio = hits / total * 100 if total else 0
+            self.stdout.write(
+                f'{namespace}: попаданий {hits}, промахов {misses} '
+                f'({ratio:.1f}%)')
+            if options['reset']:
+                cache.delete_many(
+                    [f'{namespace}:hits', f'{namespace}:misses'])
@@ -0,0 +1,65 @@
+from itertools import combinations
+
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import RequestFactory
+
+from api.filters import RecipeFilter
+from api.management.benchmark import BenchmarkCommand
+
+from recipes.models import Recipe, Tag
+
+
+class Command(BenchmarkCommand):
+    help = 'Планы запросов списка рецептов для всех комбинаций фильтров API'
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument(
+            '--limit', type=int, default=6,
+            help='Размер страницы.')
+        parser.add_argument(
+            '--analyze', action='store_true',
+            help='EXPLAIN ANALYZE (только PostgreSQL).')
+        parser.add_argument(
+            '--benchmark', type=int, default=0, metavar='N',
+            help='Вместо планов выполнить каждый запрос N раз и вывести '
+                 'медианное время.')
+
+    def handle(self, *args, **options):
+        user = self.get_user(options)
+        tag = Tag.objects.order_by('id').first()
+        if tag is None:
+            raise CommandError('Нужен хотя бы один тег.')
+        params = {
+            'tags': tag.slug,
+            'author': user.id,
+            'is_favorited': 1,
+            'is_in_shopping_cart': 1,
+            'cooking_time_max': 30,
+            'ingredients_count_max': 5,
+        }
+        explain_options = {}
+        if options['analyze'] and connection.vendor == 'postgresql':
+            explain_options['analyze'] = True
+        for size in range(len(params) + 1):
+            for names in combinations(params, size):
+                request = RequestFactory().get(
+                    '/api/recipes/', {name: params[name] for name in names})
+                request.user = user
+                filterset = RecipeFilter(
+                    request.GET,
+                    queryset=Recipe.objects.with_user_data(user),
+                    request=request)
+                if not filterset.is_valid():
+                    raise CommandError(filterset.errors)
+                queryset = filterset.qs[:options['limit']]
+                title = '?' + request.GET.urlencode() if names else (
+                    '(без фильтров)')
+                if options['benchmark']:
+                    _, timing = self.median(
+                        lambda: list(queryset.all()), options['benchmark'])
+                    self.stdout.write('%8.2f мс  %s' % (timing, title))
+                    continue
+                self.stdout.write(self.style.MIGRATE_HEADING(title))
+                self.stdout.write(queryset.explain(**explain_options))
@@ -0,0 +1,58 @@
+import re
+
+from django.conf import settings
+from django.middleware.gzip import GZipMiddleware
+from django.utils.cache import patch_vary_headers
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+re_accepts_brotli = re.compile(r'\bbr\b')
+
+
+def compress_brotli_stream(sequence, quality):
+    """Сжать поток частей ответа brotli."""
+    compressor = brotli.Compressor(quality=quality)
+    for item in sequence:
+        data = compressor.process(item)
+        if data:
+            yield data
+    yield compressor.finish()
+
+
+class CompressionMiddleware(GZipMiddleware):
+    """Сжатие ответов brotli или gzip по Accept-Encoding.
+
+    Ответы меньше COMPRESSION_MIN_SIZE байт не сжимаются, потоковые
+    (выгрузка списка покупок) сжимаются всегда. brotli используется,
+    если установлен и его принимает клиент, иначе - gzip.
+    """
+
+    def process_response(self, request, response):
+        if response.has_header('Content-Encoding'):
+            return response
+        if (not response.streaming
+                and len(response.content) < settings.COMPRESSION_MIN_SIZE):
+            return response
+        accept_encoding = request.META.get('HTTP_ACCEPT_ENCODING', '')
+        if brotli is None or not re_accepts_brotli.search(accept_encoding):
+            return super().process_response(request, response)
+        patch_vary_headers(response, ('Accept-Encoding',))
+        quality = settings.COMPRESSION_BROTLI_QUALITY
+        if response.streaming:
+            response.streaming_content = compress_brotli_stream(
+                response.streaming_content, quality)
+            del response['Content-Length']
+        else:
+            compressed = brotli.compress(response.content, quality=quality)
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response['Content-Length'] = str(len(response.content))
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        response['Content-Encoding'] = 'br'
+        return response
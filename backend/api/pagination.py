@@ -1,5 +1,120 @@
-from rest_framework.pagination import PageNumberPagination
+import hashlib
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db import connection
+from django.utils.functional import cached_property
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+from .cache import get_version, normalize_params
 
 
 class CustomPagination(PageNumberPagination):
     page_size_query_param = 'limit'
+
+
+class IdCursorPagination(CursorPagination):
+    """Курсорная пагинация по id без подсчёта общего количества."""
+
+    ordering = '-id'
+    page_size = 6
+    page_size_query_param = 'limit'
+
+
+class OptionalCursorPagination(CustomPagination):
+    """Постраничная пагинация, а при наличии ?cursor= - курсорная.
+
+    Первая страница курсорного режима запрашивается с пустым ?cursor=,
+    следующие - по ссылке next из ответа.
+    """
+
+    cursor_pagination_class = IdCursorPagination
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_paginator = None
+        cursor_param = self.cursor_pagination_class.cursor_query_param
+        if cursor_param not in request.query_params:
+            return super().paginate_queryset(queryset, request, view)
+        self.cursor_paginator = self.cursor_pagination_class()
+        return self.cursor_paginator.paginate_queryset(
+            queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is None:
+            return super().get_paginated_response(data)
+        return self.cursor_paginator.get_paginated_response(data)
+
+
+class CachedCountPaginator(Paginator):
+    """Paginator, который берёт count из кэша или из статистики БД."""
+
+    def __init__(self, object_list, per_page, count_key=None,
+                 estimate=False, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.count_key = count_key
+        self.estimate = estimate
+
+    @cached_property
+    def count(self):
+        count = cache.get(self.count_key)
+        if count is None:
+            count = self.estimated_count() if self.estimate else None
+            if count is None:
+                count = Paginator.count.func(self)
+            cache.set(self.count_key, count,
+                      settings.PAGINATION_COUNT_CACHE_TIMEOUT)
+        return count
+
+    def estimated_count(self):
+        """Оценка числа строк таблицы PostgreSQL для больших таблиц."""
+        if connection.vendor != 'postgresql':
+            return None
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT reltuples::bigint FROM pg_class '
+                'WHERE oid = %s::regclass',
+                [self.object_list.model._meta.db_table])
+            row = cursor.fetchone()
+        threshold = settings.PAGINATION_COUNT_ESTIMATE_THRESHOLD
+        if row is None or row[0] < threshold:
+            return None
+        return row[0]
+
+
+class CachedCountPagination(OptionalCursorPagination):
+    """Пагинация с кэшированием общего количества объектов.
+
+    Ключ строится по параметрам фильтрации, а для фильтров по данным
+    пользователя (user_scoped_params) - ещё и по пользователю. Версии
+    кэша сбрасываются сигналами при создании и удалении объектов.
+    """
+
+    count_cache_namespace = 'recipes_count'
+    user_scoped_params = ('is_favorited', 'is_in_shopping_cart')
+    # Параметры, которые не влияют на количество объектов.
+    ignored_params = ('format', 'fields', 'expand')
+
+    def get_count_key(self, request):
+        ignored = (self.page_query_param, self.page_size_query_param,
+                   self.cursor_pagination_class.cursor_query_param,
+                   *self.ignored_params)
+        params = normalize_params(request.query_params, ignored)
+        version = get_version(self.count_cache_namespace)
+        key = f'{self.count_cache_namespace}:{version}'
+        user_scoped = any(name in self.user_scoped_params
+                          for name, _ in params)
+        if user_scoped and request.user.is_authenticated:
+            namespace = f'{self.count_cache_namespace}:{request.user.id}'
+            key += f':{request.user.id}:{get_version(namespace)}'
+        return key + ':' + hashlib.md5(repr(params).encode()).hexdigest()
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.django_paginator_class = partial(
+            CachedCountPaginator,
+            count_key=self.get_count_key(request),
+            estimate=not request.query_params.keys() - {
+                self.page_query_param, self.page_size_query_param,
+                *self.ignored_params})
+        return super().paginate_queryset(queryset, request, view)
@@ -0,0 +1,130 @@
+import heapq
+import threading
+import time
+from array import array
+from bisect import bisect_left, insort
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.core.cache import cache, caches
+
+from recipes.models import RecipeIngredient
+from .cache import get_version, has_atomic_incr, incr_counter
+
+NAMESPACE = 'recipe_ingredients'
+
+# Больше изменений с прошлой синхронизации - индекс перечитывается целиком.
+MAX_PATCHED_CHANGES = 10000
+
+
+def change_key(version):
+    return f'{NAMESPACE}:change:{version}'
+
+
+def record_recipe_change(recipe_id):
+    """Записать в журнал кэша, что ингредиенты рецепта изменились.
+
+    Каждое изменение атомарно увеличивает версию на 1 и сохраняется под
+    ключом с этой версией, по журналу процессы обновляют только
+    изменённые рецепты.
+    """
+    key = f'{NAMESPACE}:version'
+    if not has_atomic_incr(caches['default']):
+        # Номера изменений могли бы совпасть: новая версия от времени
+        # заставит процессы перечитать индекс целиком.
+        cache.set(key, time.time_ns(), None)
+        return
+    version = incr_counter(key, time.time_ns())
+    cache.set(change_key(version), recipe_id,
+              settings.RECIPE_INDEX_CACHE_TIMEOUT)
+
+
+class RecipeIngredientIndex:
+    """Обратный индекс ингредиент -> id рецептов в памяти процесса.
+
+    Для каждого ингредиента хранится отсортированный массив id рецептов,
+    для каждого рецепта - его ингредиенты. Полностью загружается при
+    первом обращении и раз в RECIPE_INDEX_CACHE_TIMEOUT секунд, а между
+    загрузками обновляется по журналу изменений из record_recipe_change.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._postings = None
+        self._recipes = None
+        self._loaded_at = 0
+        self._version = None
+
+    def _load_all(self, version):
+        postings = defaultdict(lambda: array('q'))
+        recipes = defaultdict(list)
+        rows = RecipeIngredient.objects.order_by(
+            'ingredient_id', 'recipe_id').values_list(
+            'recipe_id', 'ingredient_id')
+        for recipe_id, ingredient_id in rows.iterator(chunk_size=10000):
+            postings[ingredient_id].append(recipe_id)
+            recipes[recipe_id].append(ingredient_id)
+        self._postings = dict(postings)
+        self._recipes = {recipe_id: tuple(ingredients)
+                         for recipe_id, ingredients in recipes.items()}
+        self._loaded_at = time.monotonic()
+        self._version = version
+
+    def _patch(self, recipe_ids):
+        current = defaultdict(list)
+        for recipe_id, ingredient_id in RecipeIngredient.objects.filter(
+                recipe_id__in=recipe_ids).values_list(
+                'recipe_id', 'ingredient_id'):
+            current[recipe_id].append(ingredient_id)
+        for recipe_id in recipe_ids:
+            for ingredient_id in self._recipes.pop(recipe_id, ()):
+                posting = self._postings[ingredient_id]
+                del posting[bisect_left(posting, recipe_id)]
+            if not current[recipe_id]:
+                continue
+            self._recipes[recipe_id] = tuple(current[recipe_id])
+            for ingredient_id in current[recipe_id]:
+                insort(self._postings.setdefault(
+                    ingredient_id, array('q')), recipe_id)
+
+    def _sync(self):
+        version = get_version(NAMESPACE)
+        expired = (time.monotonic() - self._loaded_at
+                   > settings.RECIPE_INDEX_CACHE_TIMEOUT)
+        if self._recipes is None or expired:
+            self._load_all(version)
+            return
+        if version == self._version:
+            return
+        missing = version - self._version
+        changes = {}
+        if 0 < missing <= MAX_PATCHED_CHANGES:
+            changes = cache.get_many([
+                change_key(number)
+                for number in range(self._version + 1, version + 1)])
+        if len(changes) != missing:
+            self._load_all(version)
+            return
+        self._patch(set(changes.values()))
+        self._version = version
+
+    def rank(self, ingredient_ids, limit):
+        """До limit рецептов с хотя бы одним из ingredient_ids.
+
+        Возвращает пары (id рецепта, число недостающих ингредиентов):
+        сначала рецепты, которым хватает переданных ингредиентов, затем
+        по возрастанию недостающих, при равенстве - новые первыми.
+        """
+        with self._lock:
+            self._sync()
+            overlap = Counter()
+            for ingredient_id in set(ingredient_ids):
+                overlap.update(self._postings.get(ingredient_id, ()))
+            recipes = self._recipes
+            ranked = heapq.nsmallest(limit, (
+                (len(recipes[recipe_id]) - count, -recipe_id)
+                for recipe_id, count in overlap.items()))
+        return [(-recipe_id, missing) for missing, recipe_id in ranked]
+
+
+recipe_ingredient_index = RecipeIngredientIndex()
@@ -0,0 +1,108 @@
+import csv
+import io
+import json
+
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class ORJSONRenderer(JSONRenderer):
+    """JSONRenderer на orjson.
+
+    Без установленного orjson и для ответов с отступами (indent
+    в Accept) работает как обычный JSONRenderer. Типы, которых нет
+    в orjson (Decimal, ленивые строки и т.п.), переводятся
+    JSONEncoder'ом DRF.
+    """
+
+    # Ключи-числа, как в /api/users/me/state/, json переводит в строки.
+    options = orjson.OPT_NON_STR_KEYS if orjson is not None else 0
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if orjson is None or self.get_indent(
+                accepted_media_type or '', renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        return orjson.dumps(data, default=JSONEncoder().default,
+                            option=self.options)
+
+
+class ShoppingListRenderer(BaseRenderer):
+    """Базовый renderer списка покупок.
+
+    Выбирается по ?format= или заголовку Accept. Сам список отдаётся
+    потоком через stream(ingredients) подкласса - строки файла по
+    агрегированным ингредиентам, render() нужен только для ошибок,
+    они отдаются в JSON.
+    """
+
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        response = (renderer_context or {}).get('response')
+        if response is not None:
+            response['Content-Type'] = ORJSONRenderer.media_type
+        return ORJSONRenderer().render(data)
+
+
+class TextShoppingListRenderer(ShoppingListRenderer):
+    """Список покупок в виде текста."""
+
+    media_type = 'text/plain'
+    format = 'txt'
+
+    def stream(self, ingredients):
+        for ingredient in ingredients:
+            yield '{} ({}) — {}\n'.format(
+                ingredient['ingredient__name'],
+                ingredient['ingredient__measurement_unit'],
+                ingredient['amount'])
+
+
+class CSVShoppingListRenderer(ShoppingListRenderer):
+    """Список покупок в формате csv."""
+
+    media_type = 'text/csv'
+    format = 'csv'
+
+    def stream(self, ingredients):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(('name', 'measurement_unit', 'amount'))
+        for ingredient in ingredients:
+            writer.writerow((ingredient['ingredient__name'],
+                             ingredient['ingredient__measurement_unit'],
+                             ingredient['amount']))
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        yield buffer.getvalue()
+
+
+class JSONShoppingListRenderer(ShoppingListRenderer):
+    """Список покупок в формате json."""
+
+    media_type = 'application/json'
+    format = 'json'
+
+    def stream(self, ingredients):
+        separator = '['
+        for ingredient in ingredients:
+            yield separator + json.dumps({
+                'name': ingredient['ingredient__name'],
+                'measurement_unit': ingredient['ingredient__measurement_unit'],
+                'amount': ingredient['amount'],
+            }, ensure_ascii=False)
+            separator = ','
+        yield '[]' if separator == '[' else ']'
+
+
+SHOPPING_LIST_RENDERERS = (TextShoppingListRenderer,
+                           CSVShoppingListRenderer,
+                           JSONShoppingListRenderer)
@@ -0,0 +1,60 @@
+import threading
+import time
+from bisect import bisect_left
+
+from django.conf import settings
+
+from recipes.models import Ingredient
+from .cache import get_version
+
+
+class IngredientIndex:
+    """Таблица ингредиентов в памяти процесса для автодополнения.
+
+    Загружается целиком при первом обращении и перечитывается после
+    INGREDIENTS_CACHE_TIMEOUT секунд или смены версии 'ingredients'
+    в кэше, которую сбрасывают сигналы изменения ингредиентов.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._rows = None
+        self._keys = None
+        self._loaded_at = 0
+        self._version = None
+
+    def _load(self):
+        with self._lock:
+            version = get_version('ingredients')
+            expired = (time.monotonic() - self._loaded_at
+                       > settings.INGREDIENTS_CACHE_TIMEOUT)
+            if self._rows is None or expired or version != self._version:
+                rows = sorted(
+                    Ingredient.objects.values(
+                        'id', 'name', 'measurement_unit'),
+                    key=lambda row: (row['name'].upper(), row['id']))
+                self._keys = [row['name'].upper() for row in rows]
+                self._rows = rows
+                self._loaded_at = time.monotonic()
+                self._version = version
+            return self._rows, self._keys
+
+    def search(self, name, limit):
+        """Сначала ингредиенты, начинающиеся с name, затем содержащие его."""
+        rows, keys = self._load()
+        name = name.upper()
+        found = []
+        start = bisect_left(keys, name)
+        for index in range(start, len(keys)):
+            if len(found) == limit or not keys[index].startswith(name):
+                break
+            found.append(rows[index])
+        for index, key in enumerate(keys):
+            if len(found) == limit:
+                break
+            if name in key and not key.startswith(name):
+                found.append(rows[index])
+        return found
+
+
+ingredient_index = IngredientIndex()
@@ -1,13 +1,21 @@
 import base64
+import binascii
+import io
 import re
 
 import webcolors
-from django.core.files.base import ContentFile
+from django.conf import settings
+from django.core.files.uploadedfile import (InMemoryUploadedFile,
+                                            TemporaryUploadedFile)
+from django.db import transaction
 from djoser.serializers import UserSerializer
+from PIL import Image
 from rest_framework import serializers
 from rest_framework.exceptions import ValidationError
+from rest_framework.relations import MANY_RELATION_KWARGS
 from rest_framework.validators import UniqueTogetherValidator
 
+from recipes.images import schedule_image_processing
 from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
                             Tag, UserShoppingCart)
 from users.models import Following, User
@@ -17,17 +25,95 @@ def name_is_valid(value):
     return re.compile(r'^[\w.@+-]+\Z').match(value) is not None
 
 
+# Сигнатуры форматов картинок: начало файла и расширение.
+IMAGE_SIGNATURES = (
+    (b'\xff\xd8\xff', 'jpg'),
+    (b'\x89PNG\r\n\x1a\n', 'png'),
+    (b'GIF87a', 'gif'),
+    (b'GIF89a', 'gif'),
+)
+
+
+def sniff_image_extension(header):
+    """Расширение картинки по первым байтам файла."""
+    if header[:4] == b'RIFF' and header[8:12] == b'WEBP':
+        return 'webp'
+    for signature, extension in IMAGE_SIGNATURES:
+        if header.startswith(signature):
+            return extension
+    return None
+
+
 class Base64ImageField(serializers.ImageField):
-    """Для картинок."""
+    """Для картинок.
+
+    Размер проверяется до декодирования, base64 декодируется частями
+    в память или во временный файл (как загрузки Django, по
+    FILE_UPLOAD_MAX_MEMORY_SIZE), формат определяется по содержимому.
+    """
+
+    chunk_size = 64 * 1024
 
     def to_internal_value(self, data):
         if isinstance(data, str) and data.startswith('data:image'):
-            format, imgstr = data.split(';base64,')
-            ext = format.split('/')[-1]
-            data = ContentFile(base64.b64decode(imgstr), name='temp.' + ext)
-
+            data = self.decode(data)
         return super().to_internal_value(data)
 
+    def decode(self, data):
+        start = data.find(';base64,')
+        if start == -1:
+            raise ValidationError('Картинка должна быть в base64.')
+        start += len(';base64,')
+        size = (len(data) - start) * 3 // 4
+        if size > settings.IMAGE_MAX_SIZE:
+            raise ValidationError(
+                'Размер картинки больше %d МБ.'
+                % (settings.IMAGE_MAX_SIZE // 1024 // 1024))
+        if size > settings.FILE_UPLOAD_MAX_MEMORY_SIZE:
+            file = TemporaryUploadedFile('temp', None, size, None)
+        else:
+            file = InMemoryUploadedFile(
+                io.BytesIO(), None, 'temp', None, size, None)
+        try:
+            extension = self.write_image(file, data, start)
+        except ValidationError:
+            file.close()
+            raise
+        file.name = f'temp.{extension}'
+        return file
+
+    def write_image(self, file, data, start):
+        """Декодировать base64 в file и проверить картинку."""
+        # Переносы строк (base64 по 76 символов) пропускаются, в декодер
+        # идут группы по 4 символа, остаток переносится в следующую часть.
+        pending = ''
+        try:
+            for offset in range(start, len(data), self.chunk_size):
+                chunk = pending + ''.join(
+                    data[offset:offset + self.chunk_size].split())
+                usable = len(chunk) - len(chunk) % 4
+                file.write(base64.b64decode(chunk[:usable], validate=True))
+                pending = chunk[usable:]
+            if pending:
+                file.write(base64.b64decode(pending, validate=True))
+        except binascii.Error:
+            raise ValidationError('Некорректная картинка в base64.')
+        file.size = file.tell()
+        file.seek(0)
+        extension = sniff_image_extension(file.read(16))
+        if extension is None:
+            raise ValidationError('Неподдерживаемый формат картинки.')
+        file.seek(0)
+        try:
+            with Image.open(file) as image:
+                width, height = image.size
+        except Exception:
+            raise ValidationError('Некорректная картинка.')
+        if width * height > settings.IMAGE_MAX_PIXELS:
+            raise ValidationError('Слишком большое разрешение картинки.')
+        file.seek(0)
+        return extension
+
 
 class Hex2NameColor(serializers.Field):
     """Для цветов в тегах."""
@@ -43,7 +129,77 @@ class Hex2NameColor(serializers.Field):
         return data
 
 
-class CustomUserSerializer(UserSerializer):
+def parse_field_names(value):
+    """Имена полей из параметра вида 'id,name,author.username'."""
+    names = [name.strip() for name in (value or '').split(',')]
+    return [name for name in names if name] or None
+
+
+def sparse_fields_context(request, summary=False):
+    """Контекст сериализатора с полями из ?fields= и ?expand=.
+
+    summary - по умолчанию отдавать краткое представление
+    (summary_fields сериализатора).
+    """
+    return {
+        'fields': parse_field_names(request.query_params.get('fields')),
+        'expand': parse_field_names(request.query_params.get('expand')),
+        'summary': summary,
+    }
+
+
+class SparseFieldsMixin:
+    """Только запрошенные поля ответа.
+
+    ?fields=id,name,author.username оставляет перечисленные поля,
+    вложенные - через точку. ?expand=text добавляет поля к краткому
+    представлению, которое отдаётся при summary в контексте. Остальные
+    поля не сериализуются.
+    """
+
+    summary_fields = None
+
+    @property
+    def field_path(self):
+        """Путь к сериализатору от корневого через точку."""
+        names = []
+        node = self
+        while node is not None:
+            if getattr(node, 'field_name', None):
+                names.append(node.field_name)
+            node = getattr(node, 'parent', None)
+        return '.'.join(reversed(names))
+
+    def get_selected_names(self):
+        """Имена оставляемых полей или None, если нужны все."""
+        prefix = self.field_path
+        prefix = prefix + '.' if prefix else ''
+
+        def level(names):
+            return {name[len(prefix):].split('.')[0] for name in names or ()
+                    if name.startswith(prefix)}
+
+        expand = level(self.context.get('expand'))
+        requested = level(self.context.get('fields'))
+        if requested:
+            return requested | expand
+        if (not prefix and self.context.get('summary')
+                and self.summary_fields is not None):
+            return set(self.summary_fields) | expand
+        return None
+
+    def get_fields(self):
+        fields = super().get_fields()
+        selected = self.get_selected_names()
+        if selected is None:
+            return fields
+        for name in list(fields):
+            if name not in selected:
+                del fields[name]
+        return fields
+
+
+class CustomUserSerializer(SparseFieldsMixin, UserSerializer):
     """Serializer для /users."""
 
     is_subscribed = serializers.SerializerMethodField('get_is_subscribed')
@@ -55,6 +211,8 @@ class CustomUserSerializer(UserSerializer):
                   'is_subscribed')
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         user = self.context.get('request').user
         return (user.is_authenticated and Following.objects.filter(
             user=user, following=obj).exists())
@@ -105,23 +263,32 @@ class RecipeIngredienReadSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'amount', 'measurement_unit')
 
 
-class RecipeSerializer(serializers.ModelSerializer):
+class RecipeSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """Serializer для рецептов."""
 
+    # Краткое представление для списков: без описания и ингредиентов.
+    summary_fields = ('id', 'author', 'cooking_time', 'name', 'image',
+                      'image_thumb', 'tags', 'is_favorited',
+                      'is_in_shopping_cart')
+
     author = CustomUserSerializer()
     tags = TagSerializer(many=True, read_only=True)
     ingredients = RecipeIngredienReadSerializer(many=True, read_only=True,
                                                 source='ingredients_in_recipe')
     image = Base64ImageField(required=False, allow_null=True)
+    image_thumb = serializers.ImageField(read_only=True)
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
 
     class Meta:
         model = Recipe
         fields = ('id', 'author', 'cooking_time', 'name', 'text', 'image',
-                  'tags', 'ingredients', 'is_favorited', 'is_in_shopping_cart')
+                  'image_thumb', 'tags', 'ingredients', 'is_favorited',
+                  'is_in_shopping_cart')
 
     def get_is_favorited(self, obj):
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         request = self.context.get('request')
         user = request.user
         return (user.is_authenticated and Favorite.objects.filter(
@@ -129,6 +296,8 @@ class RecipeSerializer(serializers.ModelSerializer):
             user=user).exists())
 
     def get_is_in_shopping_cart(self, obj):
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         request = self.context.get('request')
         user = request.user
         return (user.is_authenticated and UserShoppingCart.objects.filter(
@@ -136,22 +305,79 @@ class RecipeSerializer(serializers.ModelSerializer):
             user=user).exists())
 
 
+def get_objects_by_ids(queryset, ids):
+    """Объекты по списку id одним запросом, все ненайденные id - в ошибке."""
+    objects = queryset.in_bulk(set(ids))
+    missing = sorted(set(ids) - objects.keys())
+    if missing:
+        raise ValidationError(
+            'Не найдены объекты с id: %s.' % ', '.join(map(str, missing)))
+    return objects
+
+
+class BulkManyRelatedField(serializers.ManyRelatedField):
+    """Список связанных объектов, который достаётся одним запросом."""
+
+    def to_internal_value(self, data):
+        if isinstance(data, str) or not hasattr(data, '__iter__'):
+            self.fail('not_a_list', input_type=type(data).__name__)
+        if not self.allow_empty and len(data) == 0:
+            self.fail('empty')
+        ids = []
+        for item in data:
+            if isinstance(item, bool):
+                self.child_relation.fail(
+                    'incorrect_type', data_type=type(item).__name__)
+            try:
+                ids.append(int(item))
+            except (TypeError, ValueError):
+                self.child_relation.fail(
+                    'incorrect_type', data_type=type(item).__name__)
+        objects = get_objects_by_ids(self.child_relation.get_queryset(), ids)
+        return [objects[pk] for pk in ids]
+
+
+class BulkPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """PrimaryKeyRelatedField, который при many=True делает один запрос."""
+
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        list_kwargs = {'child_relation': cls(*args, **kwargs)}
+        for key in kwargs:
+            if key in MANY_RELATION_KWARGS:
+                list_kwargs[key] = kwargs[key]
+        return BulkManyRelatedField(**list_kwargs)
+
+
+class RecipeIngredientListSerializer(serializers.ListSerializer):
+    """Ингредиенты рецепта: все id заменяются на объекты одним запросом."""
+
+    def to_internal_value(self, data):
+        ingredients = super().to_internal_value(data)
+        objects = get_objects_by_ids(
+            Ingredient.objects.all(),
+            [ingredient['id'] for ingredient in ingredients])
+        for ingredient in ingredients:
+            ingredient['id'] = objects[ingredient['id']]
+        return ingredients
+
+
 class RecipeIngredientSerializer(serializers.ModelSerializer):
     """Serializer для промежуточной таблицы Рецепт-Ингердиент."""
 
-    id = serializers.PrimaryKeyRelatedField(queryset=Ingredient.objects.all())
+    id = serializers.IntegerField()
 
     class Meta:
         model = RecipeIngredient
         fields = ('id', 'amount')
+        list_serializer_class = RecipeIngredientListSerializer
 
 
 class RecipeCreateSerializer(serializers.ModelSerializer):
     """Serializer для создания рецептов."""
 
     author = CustomUserSerializer(read_only=True)
-    tags = serializers.PrimaryKeyRelatedField(queryset=Tag.objects.all(),
-                                              many=True)
+    tags = BulkPrimaryKeyRelatedField(queryset=Tag.objects.all(), many=True)
     ingredients = RecipeIngredientSerializer(many=True)
     image = Base64ImageField(required=False, allow_null=True)
 
@@ -161,6 +387,10 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
                   'tags', 'ingredients',)
 
     def to_representation(self, value):
+        # Перечитываем рецепт со связями, чтобы ответ не зависел от
+        # количества ингредиентов.
+        value = Recipe.objects.with_user_data(
+            self.context['request'].user).get(id=value.id)
         return RecipeSerializer(value, context=self.context).data
 
     def ingredient_create(self, recipe, ingredients):
@@ -173,23 +403,89 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
         RecipeIngredient.objects.bulk_create(
             recipe_list)
 
+    def save(self, **kwargs):
+        recipe = super().save(**kwargs)
+        image = self.validated_data.get('image')
+        if image is not None:
+            # Временный файл картинки уже перенесён в хранилище.
+            image.close()
+        return recipe
+
     def create(self, validated_data):
         tags = validated_data.pop('tags')
         ingredients = validated_data.pop('ingredients')
-        recipe = Recipe.objects.create(**validated_data)
-        recipe.tags.set(tags)
-        self.ingredient_create(recipe, ingredients)
+        with transaction.atomic():
+            recipe = Recipe.objects.create(
+                **validated_data, ingredients_count=len(ingredients))
+            recipe.tags.set(tags)
+            self.ingredient_create(recipe, ingredients)
+            if recipe.image:
+                schedule_image_processing(recipe.id)
         return recipe
 
+    def update_ingredients(self, recipe, ingredients):
+        """Привести ингредиенты рецепта к списку, меняя только разницу.
+
+        Текущие строки читаются заново, а не из prefetch get_object():
+        вызывается под блокировкой рецепта в update().
+        """
+        current = {item.ingredient_id: item
+                   for item in RecipeIngredient.objects.filter(recipe=recipe)}
+        to_create, to_update = [], []
+        for ingredient in ingredients:
+            item = current.pop(ingredient['id'].id, None)
+            if item is None:
+                to_create.append(RecipeIngredient(
+                    recipe=recipe, ingredient=ingredient['id'],
+                    amount=ingredient['amount']))
+            elif item.amount != ingredient['amount']:
+                item.amount = ingredient['amount']
+                to_update.append(item)
+        if current:
+            RecipeIngredient.objects.filter(
+                id__in=[item.id for item in current.values()]).delete()
+        if to_update:
+            RecipeIngredient.objects.bulk_update(to_update, ['amount'])
+        if to_create:
+            RecipeIngredient.objects.bulk_create(to_create)
+
+    def is_current_image(self, recipe, image):
+        """image совпадает с уже сохранённой картинкой рецепта."""
+        if not recipe.image:
+            return False
+        field = recipe.image.field
+        return field.storage.hashed_name(
+            field.generate_filename(recipe, image.name),
+            image) == recipe.image.name
+
     def update(self, recipe, validated_data):
-        tags = validated_data.pop('tags')
-        ingredients = validated_data.pop('ingredients')
-        recipe = super().update(recipe, validated_data)
-        recipe.tags.clear()
-        recipe.tags.set(tags)
-        recipe.ingredients.clear()
-        self.ingredient_create(recipe, ingredients)
-        recipe.save()
+        tags = validated_data.pop('tags', None)
+        ingredients = validated_data.pop('ingredients', None)
+        image = validated_data.get('image')
+        if image is not None and self.is_current_image(recipe, image):
+            # Клиент вернул уже отданную картинку: повторное сжатие
+            # ухудшило бы её и дало новый файл.
+            del validated_data['image']
+        if 'image' in validated_data:
+            validated_data['image_thumb'] = None
+        if ingredients is not None:
+            validated_data['ingredients_count'] = len(ingredients)
+        with transaction.atomic():
+            # Параллельные PATCH одного рецепта выполняются по очереди,
+            # иначе оба считают разницу ингредиентов от одних строк.
+            list(Recipe.objects.select_for_update().filter(
+                id=recipe.id).values_list('id', flat=True))
+            # Пишутся только переданные поля: остальные (счётчики,
+            # миниатюра) могли измениться после чтения рецепта.
+            for name, value in validated_data.items():
+                setattr(recipe, name, value)
+            recipe.save(update_fields=list(validated_data))
+            if tags is not None:
+                recipe.tags.set(tags)
+            if ingredients is not None:
+                self.update_ingredients(recipe, ingredients)
+            if validated_data.get('image'):
+                schedule_image_processing(recipe.id)
         return recipe
 
     def validate_ingredients(self, ingredients):
@@ -202,13 +498,11 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
                 raise ValidationError(
                     'Укажите вес/количество ингредиентов.'
                 )
-        ingredients_list = []
-        for ingredient in ingredients:
-            if ingredient in ingredients_list:
-                raise ValidationError(
-                    'Ингредиенты в рецепте не могут повторяться.'
-                )
-            ingredients_list.append(ingredient)
+        if len({ingredient['id'] for ingredient in ingredients}) != len(
+                ingredients):
+            raise ValidationError(
+                'Ингредиенты в рецепте не могут повторяться.'
+            )
         return ingredients
 
     def validate_cooking_time(self, value):
@@ -249,18 +543,19 @@ class FollowRecipeSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'image_thumb', 'cooking_time')
 
 
 class FollowingSerializer(serializers.ModelSerializer):
-    """Сериализатор для подписки."""
+    """Сериализатор для подписки.
+
+    Ожидает авторов из CustomUserViewSet.get_subscriptions_queryset:
+    limited_recipes уже выбраны в запросе, recipes_count - счётчик.
+    """
 
     is_subscribed = serializers.SerializerMethodField(read_only=True)
     recipes = serializers.SerializerMethodField(read_only=True)
-    recipes_count = serializers.IntegerField(
-        source='recipes.count',
-        read_only=True
-    )
+    recipes_count = serializers.IntegerField(read_only=True)
 
     class Meta:
         model = User
@@ -290,17 +585,13 @@ class FollowingSerializer(serializers.ModelSerializer):
         return data
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         user = self.context.get('request').user
         return (user.is_authenticated and Following.objects.filter(
             following=obj, user=user).exists())
 
     def get_recipes(self, obj):
-        request = self.context.get('request')
-        limit_recipes = request.query_params.get('recipes_limit')
-        if limit_recipes is not None:
-            recipes = obj.recipes.all()[:(int(limit_recipes))]
-        else:
-            recipes = obj.recipes.all()
-        context = {'request': request}
-        return FollowRecipeSerializer(recipes, many=True,
+        context = {'request': self.context.get('request')}
+        return FollowRecipeSerializer(obj.limited_recipes, many=True,
                                       context=context).data
@@ -0,0 +1,142 @@
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from recipes.counters import change_counter
+from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                            Tag, UserShoppingCart)
+from recipes.search import update_search_vectors
+from recipes.signals import data_imported, image_processed
+from users.models import Following, User
+from .cache import bump_version
+from .feed import (fan_out_recipe, feed_key, remove_from_feeds,
+                   schedule_feed_update)
+from .recipe_index import record_recipe_change
+
+
+@receiver((post_save, post_delete, data_imported), sender=Tag)
+def invalidate_tags(**kwargs):
+    bump_version('tags')
+
+
+@receiver((post_save, post_delete, data_imported), sender=Ingredient)
+def invalidate_ingredients(**kwargs):
+    bump_version('ingredients')
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+def invalidate_recipes_count(created=True, **kwargs):
+    # После коммита, как и invalidate_recipes: иначе параллельный
+    # запрос закэширует старое количество на весь срок.
+    if created:
+        transaction.on_commit(lambda: bump_version('recipes_count'))
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def invalidate_recipes_count_by_tags(action, **kwargs):
+    if action.startswith('post_'):
+        transaction.on_commit(lambda: bump_version('recipes_count'))
+
+
+@receiver((post_save, post_delete), sender=Favorite)
+@receiver((post_save, post_delete), sender=UserShoppingCart)
+def invalidate_user_recipes_count(instance, **kwargs):
+    namespace = f'recipes_count:{instance.user_id}'
+    transaction.on_commit(lambda: bump_version(namespace))
+
+
+@receiver((post_save, post_delete, data_imported), sender=Tag)
+@receiver((post_save, post_delete, data_imported), sender=Ingredient)
+@receiver((post_save, post_delete, image_processed), sender=Recipe)
+@receiver((post_save, post_delete), sender=RecipeIngredient)
+def invalidate_recipes(**kwargs):
+    # После коммита, чтобы параллельный запрос не закэшировал
+    # старые данные с новой версией.
+    transaction.on_commit(lambda: bump_version('recipes'))
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def invalidate_recipes_by_tags(action, **kwargs):
+    if action.startswith('post_'):
+        transaction.on_commit(lambda: bump_version('recipes'))
+
+
+@receiver((post_save, post_delete), sender=User)
+def invalidate_recipes_by_user(update_fields=None, **kwargs):
+    if update_fields is None or set(update_fields) - {'last_login'}:
+        transaction.on_commit(lambda: bump_version('recipes'))
+
+
+@receiver(post_save, sender=Recipe)
+def update_recipe_search_vector(instance, raw=False, **kwargs):
+    # После коммита: ингредиенты нового рецепта добавляются после save().
+    if not raw:
+        transaction.on_commit(lambda: update_search_vectors(
+            Recipe.objects.filter(id=instance.id)))
+
+
+@receiver(post_save, sender=Ingredient)
+def update_ingredient_search_vectors(instance, created, raw=False,
+                                     **kwargs):
+    if not created and not raw:
+        transaction.on_commit(lambda: update_search_vectors(
+            Recipe.objects.filter(ingredients=instance)))
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+def update_recipe_index(instance, **kwargs):
+    # Ингредиенты сериализатор меняет bulk-операциями без сигналов,
+    # но рецепт при этом всегда сохраняется.
+    transaction.on_commit(lambda: record_recipe_change(instance.id))
+
+
+@receiver((post_save, post_delete), sender=RecipeIngredient)
+def update_recipe_index_by_ingredient(instance, **kwargs):
+    transaction.on_commit(lambda: record_recipe_change(instance.recipe_id))
+
+
+@receiver((post_save, post_delete), sender=Following)
+def invalidate_feed(instance, **kwargs):
+    cache.delete(feed_key(instance.user_id))
+
+
+@receiver(post_save, sender=Recipe)
+def add_to_feeds(instance, created, raw=False, **kwargs):
+    if created and not raw:
+        schedule_feed_update(fan_out_recipe, instance.id, instance.author_id)
+
+
+@receiver(post_delete, sender=Recipe)
+def delete_from_feeds(instance, **kwargs):
+    schedule_feed_update(remove_from_feeds, instance.id, instance.author_id)
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=UserShoppingCart)
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=Following)
+def increment_counters(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        update_counters(sender, instance, 1)
+
+
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=UserShoppingCart)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=Following)
+def decrement_counters(sender, instance, **kwargs):
+    update_counters(sender, instance, -1)
+
+
+def update_counters(sender, instance, delta):
+    """Счётчики, которые меняются при добавлении/удалении instance."""
+    if sender is Favorite:
+        change_counter(Recipe, instance.recipe_id, 'favorites_count', delta)
+    elif sender is UserShoppingCart:
+        change_counter(Recipe, instance.recipe_id, 'in_carts_count', delta)
+    elif sender is Recipe:
+        change_counter(User, instance.author_id, 'recipes_count', delta)
+    elif sender is Following:
+        change_counter(User, instance.following_id, 'followers_count',
+                       delta)
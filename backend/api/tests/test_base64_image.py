@@ -0,0 +1,52 @@
+import base64
+import io
+import textwrap
+
+from django.test import SimpleTestCase
+from PIL import Image
+from rest_framework.exceptions import ValidationError
+
+from api.serializers import Base64ImageField
+
+
+def image_data(line_length=None, separator='\n'):
+    buffer = io.BytesIO()
+    Image.new('RGB', (40, 30), 'red').save(buffer, 'PNG')
+    encoded = base64.b64encode(buffer.getvalue()).decode()
+    if line_length:
+        encoded = separator.join(textwrap.wrap(encoded, line_length))
+    return 'data:image/png;base64,' + encoded
+
+
+class Base64ImageFieldTest(SimpleTestCase):
+    """Декодирование base64 частями."""
+
+    def decode(self, data, chunk_size=7):
+        field = Base64ImageField()
+        # Маленькие части, чтобы границы попадали внутрь групп base64.
+        field.chunk_size = chunk_size
+        file = field.decode(data)
+        try:
+            file.seek(0)
+            with Image.open(file) as image:
+                return image.size
+        finally:
+            file.close()
+
+    def test_plain(self):
+        self.assertEqual(self.decode(image_data()), (40, 30))
+
+    def test_line_breaks(self):
+        for separator in ('\n', '\r\n'):
+            for chunk_size in (5, 7, 76, 64 * 1024):
+                with self.subTest(separator=separator, chunk_size=chunk_size):
+                    self.assertEqual(self.decode(
+                        image_data(76, separator), chunk_size), (40, 30))
+
+    def test_invalid_characters(self):
+        with self.assertRaises(ValidationError):
+            self.decode(image_data().replace('A', '*', 1))
+
+    def test_truncated(self):
+        with self.assertRaises(ValidationError):
+            self.decode(image_data()[:-3])
@@ -0,0 +1,120 @@
+import shutil
+import tempfile
+import time
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from api.cache import HitCounter, bump_version, get_version
+from api.recipe_index import change_key, record_recipe_change
+
+from recipes.models import Recipe, Tag
+from users.models import User
+
+
+class VersionTimeoutTest(SimpleTestCase):
+    """Версия после сброса хранится без срока жизни и на файловом кэше."""
+
+    def setUp(self):
+        location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, location, True)
+        settings_override = override_settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': location,
+            'TIMEOUT': 1,
+        }})
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_bumped_version_does_not_expire(self):
+        version = get_version('test')
+        bump_version('test')
+        later = time.time() + 10
+        with mock.patch('django.core.cache.backends.filebased.time.time',
+                        return_value=later):
+            self.assertEqual(cache.get('test:version'), version + 1)
+            self.assertEqual(get_version('test'), version + 1)
+
+
+class HitCounterTest(SimpleTestCase):
+    """Попадания копятся в процессе и пишутся в кэш раз в интервал."""
+
+    def setUp(self):
+        cache.clear()
+
+    def test_flushed_once_per_interval(self):
+        counter = HitCounter()
+        with override_settings(CACHE_STATS_FLUSH_INTERVAL=60):
+            for _ in range(3):
+                counter.record('test', True)
+            counter.record('test', False)
+        self.assertIsNone(cache.get('test:hits'))
+        with override_settings(CACHE_STATS_FLUSH_INTERVAL=0):
+            counter.record('test', True)
+        self.assertEqual(cache.get('test:hits'), 4)
+        self.assertEqual(cache.get('test:misses'), 1)
+
+    def test_not_flushed_without_atomic_incr(self):
+        counter = HitCounter()
+        with override_settings(CACHE_STATS_FLUSH_INTERVAL=0), mock.patch(
+                'api.cache.has_atomic_incr', return_value=False):
+            counter.record('test', True)
+        self.assertIsNone(cache.get('test:hits'))
+
+
+class RecipeChangeLogTest(SimpleTestCase):
+    """Каждое изменение рецепта получает свой номер в журнале индекса."""
+
+    def setUp(self):
+        cache.clear()
+
+    def test_changes_get_consecutive_versions(self):
+        record_recipe_change(1)
+        record_recipe_change(2)
+        version = cache.get('recipe_ingredients:version')
+        self.assertEqual(cache.get(change_key(version - 1)), 1)
+        self.assertEqual(cache.get(change_key(version)), 2)
+
+    def test_without_atomic_incr_forces_reload(self):
+        version = get_version('recipe_ingredients')
+        with mock.patch('api.recipe_index.has_atomic_incr',
+                        return_value=False):
+            record_recipe_change(1)
+        new_version = cache.get('recipe_ingredients:version')
+        self.assertNotIn(new_version, (version, version + 1))
+        self.assertIsNone(cache.get(change_key(version + 1)))
+
+
+class RecipesCountVersionTest(TestCase):
+    """Версия количества рецептов сбрасывается только после коммита."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(
+            username='author', email='author@example.com')
+        cls.tag = Tag.objects.create(name='tag', slug='tag',
+                                     color='#FF0000')
+
+    def setUp(self):
+        cache.clear()
+
+    def assert_bumped_on_commit(self, namespace, change):
+        version = get_version(namespace)
+        with self.captureOnCommitCallbacks() as callbacks:
+            change()
+        self.assertEqual(get_version(namespace), version)
+        for callback in callbacks:
+            callback()
+        self.assertGreater(get_version(namespace), version)
+
+    def test_recipe_created(self):
+        self.assert_bumped_on_commit('recipes_count', lambda: (
+            Recipe.objects.create(name='recipe', text='text',
+                                  cooking_time=1, author=self.author)))
+
+    def test_tags_changed(self):
+        recipe = Recipe.objects.create(
+            name='recipe', text='text', cooking_time=1, author=self.author)
+        self.assert_bumped_on_commit(
+            'recipes_count', lambda: recipe.tags.set([self.tag]))
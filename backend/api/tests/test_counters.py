@@ -0,0 +1,63 @@
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from recipes.counters import change_counter
+from recipes.models import Recipe
+from users.models import User
+
+
+class CounterSaveTest(TestCase):
+    """Полный save() не возвращает старые счётчики и миниатюру."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(
+            username='author', email='author@example.com')
+
+    def setUp(self):
+        self.recipe = Recipe.objects.create(
+            name='recipe', text='text', cooking_time=5, author=self.author)
+
+    def test_recipe_save_keeps_counters(self):
+        change_counter(Recipe, self.recipe.id, 'favorites_count', 1)
+        Recipe.objects.filter(id=self.recipe.id).update(
+            image_thumb='recipes/thumbs/image.webp')
+        self.recipe.name = 'new name'
+        self.recipe.save()
+        recipe = Recipe.objects.get(id=self.recipe.id)
+        self.assertEqual(recipe.name, 'new name')
+        self.assertEqual(recipe.favorites_count, 1)
+        self.assertEqual(recipe.image_thumb, 'recipes/thumbs/image.webp')
+
+    def test_explicit_update_fields_are_written(self):
+        self.recipe.favorites_count = 7
+        self.recipe.save(update_fields=['favorites_count'])
+        self.assertEqual(Recipe.objects.get(
+            id=self.recipe.id).favorites_count, 7)
+
+    def test_user_save_keeps_counters(self):
+        user = User.objects.get(id=self.author.id)
+        change_counter(User, self.author.id, 'followers_count', 1)
+        user.set_password('new-password')
+        user.save()
+        user = User.objects.get(id=self.author.id)
+        self.assertTrue(user.check_password('new-password'))
+        self.assertEqual(user.followers_count, 1)
+        self.assertEqual(user.recipes_count, 1)
+
+    def test_patch_writes_only_sent_fields(self):
+        client = APIClient()
+        client.force_authenticate(self.author)
+        with CaptureQueriesContext(connection) as queries:
+            response = client.patch(
+                f'/api/recipes/{self.recipe.id}/', {'name': 'new name'},
+                format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        updates = [query['sql'] for query in queries.captured_queries
+                   if query['sql'].startswith('UPDATE "recipes_recipe" ')]
+        self.assertEqual(len(updates), 1)
+        self.assertIn('"name"', updates[0])
+        for name in Recipe.update_only_fields:
+            self.assertNotIn(f'"{name}"', updates[0])
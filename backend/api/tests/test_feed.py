@@ -0,0 +1,73 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from api.feed import fan_out_recipe, feed_key, get_cached_feed, run_in_worker
+
+from recipes.models import Ingredient, Recipe, Tag
+from users.models import Following, User
+
+
+@override_settings(FEED_FANOUT_WORKERS=0)
+class FeedFanOutTest(TestCase):
+    """Раскладка рецептов по закэшированным лентам подписчиков."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(
+            username='author', email='author@example.com')
+        cls.reader = User.objects.create(
+            username='reader', email='reader@example.com')
+        Following.objects.create(user=cls.reader, following=cls.author)
+        cls.tag = Tag.objects.create(name='tag', slug='tag',
+                                     color='#FF0000')
+        cls.ingredient = Ingredient.objects.create(
+            name='ingredient', measurement_unit='г')
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.author)
+        self.old = Recipe.objects.create(
+            name='old', text='text', cooking_time=1, author=self.author)
+
+    def create_recipe(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/recipes/', {
+                'name': 'new', 'text': 'text', 'cooking_time': 1,
+                'tags': [self.tag.id],
+                'ingredients': [{'id': self.ingredient.id, 'amount': 1}],
+            }, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        return response.data['id']
+
+    def test_new_recipe_added_to_cached_feed(self):
+        get_cached_feed(self.reader)
+        recipe_id = self.create_recipe()
+        self.assertEqual(cache.get(feed_key(self.reader.id)),
+                         [recipe_id, self.old.id])
+
+    def test_feed_rebuilt_before_fan_out_has_recipe_once(self):
+        recipe = Recipe.objects.create(
+            name='new', text='text', cooking_time=1, author=self.author)
+        get_cached_feed(self.reader)
+        fan_out_recipe(recipe.id, self.author.id)
+        self.assertEqual(cache.get(feed_key(self.reader.id)),
+                         [recipe.id, self.old.id])
+
+    def test_deleted_recipe_removed_from_cached_feed(self):
+        recipe_id = self.create_recipe()
+        get_cached_feed(self.reader)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.delete(f'/api/recipes/{recipe_id}/')
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(cache.get(feed_key(self.reader.id)), [self.old.id])
+
+    @override_settings(FEED_FANOUT_WORKERS=1)
+    def test_fan_out_runs_in_worker(self):
+        with mock.patch('api.feed.executor') as executor:
+            recipe_id = self.create_recipe()
+        executor.submit.assert_called_once_with(
+            run_in_worker, fan_out_recipe, recipe_id, self.author.id)
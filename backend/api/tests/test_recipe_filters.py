@@ -0,0 +1,128 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from recipes.models import Favorite, Ingredient, Recipe, RecipeIngredient, Tag
+from users.models import User
+
+
+class RecipeTagFilterTest(TestCase):
+    """Фильтр по тегам отдаёт каждый рецепт один раз."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(
+            username='reader', email='reader@example.com')
+        cls.tags = [Tag.objects.create(name=f'tag{i}', slug=f'tag{i}',
+                                       color='#FF0000') for i in range(6)]
+        cls.recipes = []
+        for i in range(10):
+            recipe = Recipe.objects.create(
+                name=f'recipe{i}', text='text', cooking_time=1,
+                author=cls.user)
+            # У рецептов с чётным номером все теги, у остальных - первые.
+            recipe.tags.set(cls.tags if i % 2 == 0 else cls.tags[:3])
+            Favorite.objects.create(user=cls.user, recipe=recipe)
+            cls.recipes.append(recipe)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def get_ids(self, params):
+        response = self.client.get(
+            '/api/recipes/', {'limit': 100, **params})
+        self.assertEqual(response.status_code, 200)
+        ids = [recipe['id'] for recipe in response.data['results']]
+        self.assertEqual(len(ids), response.data['count'])
+        return ids
+
+    def test_any_returns_each_recipe_once(self):
+        ids = self.get_ids({'tags': [tag.slug for tag in self.tags],
+                            'tags_mode': 'any', 'is_favorited': 1})
+        self.assertCountEqual(ids, [recipe.id for recipe in self.recipes])
+
+    def test_any_is_default(self):
+        ids = self.get_ids({'tags': [tag.slug for tag in self.tags]})
+        self.assertCountEqual(ids, [recipe.id for recipe in self.recipes])
+
+    def test_all_returns_each_recipe_once(self):
+        ids = self.get_ids({'tags': [tag.slug for tag in self.tags],
+                            'tags_mode': 'all', 'is_favorited': 1})
+        self.assertCountEqual(
+            ids, [recipe.id for recipe in self.recipes[::2]])
+
+    def test_all_with_shared_tags(self):
+        ids = self.get_ids({'tags': [tag.slug for tag in self.tags[:3]],
+                            'tags_mode': 'all'})
+        self.assertCountEqual(ids, [recipe.id for recipe in self.recipes])
+
+
+@override_settings(RECIPES_HAVE_LIMIT=2)
+class RecipeHaveFilterTest(TestCase):
+    """Лучшие по ?have= выбираются среди прошедших другие фильтры."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(
+            username='author', email='author@example.com')
+        cls.other = User.objects.create(
+            username='other', email='other@example.com')
+        cls.tag = Tag.objects.create(name='tag', slug='tag',
+                                     color='#FF0000')
+        cls.ingredients = [
+            Ingredient.objects.create(name=f'ingredient{i}',
+                                      measurement_unit='г')
+            for i in range(3)]
+        # У рецептов other хватает ингредиентов, и в общем топе они выше.
+        cls.best = [cls.create_recipe(cls.other, cls.ingredients[:1])
+                    for _ in range(3)]
+        cls.worse = [cls.create_recipe(cls.author, cls.ingredients)
+                     for _ in range(3)]
+        for recipe in cls.worse[:2]:
+            recipe.tags.set([cls.tag])
+
+    @classmethod
+    def create_recipe(cls, author, ingredients):
+        recipe = Recipe.objects.create(
+            name='recipe', text='text', cooking_time=1, author=author)
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(recipe=recipe, ingredient=ingredient, amount=1)
+            for ingredient in ingredients)
+        return recipe
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def get_ids(self, params):
+        response = self.client.get('/api/recipes/', {
+            'limit': 100, 'have': self.ingredients[0].id, **params})
+        self.assertEqual(response.status_code, 200)
+        return [recipe['id'] for recipe in response.json()['results']]
+
+    def test_limit_over_all_recipes(self):
+        self.assertEqual(self.get_ids({}),
+                         [recipe.id for recipe in self.best[::-1][:2]])
+
+    def test_author_applied_before_limit(self):
+        self.assertEqual(self.get_ids({'author': self.author.id}),
+                         [recipe.id for recipe in self.worse[::-1][:2]])
+
+    def test_tags_applied_before_limit(self):
+        self.assertEqual(self.get_ids({'tags': self.tag.slug}),
+                         [recipe.id for recipe in self.worse[1::-1]])
+
+    @override_settings(RECIPES_HAVE_SCAN_LIMIT=2)
+    def test_scan_limit(self):
+        self.assertEqual(self.get_ids({'author': self.author.id}), [])
+
+    def test_filtered_set_not_loaded(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.get_ids({'author': self.author.id})
+        for query in queries.captured_queries:
+            if query['sql'].startswith('SELECT "recipes_recipe"."id" FROM'):
+                self.assertIn('"recipes_recipe"."id" IN (', query['sql'])
@@ -0,0 +1,64 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                            Tag, UserShoppingCart)
+from users.models import Following, User
+
+
+class RecipeListQueriesTest(TestCase):
+    """Число запросов списка рецептов не зависит от размера страницы."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(
+            username='reader', email='reader@example.com')
+        authors = [
+            User.objects.create(username=f'author{i}',
+                                email=f'author{i}@example.com')
+            for i in range(3)]
+        Following.objects.create(user=cls.user, following=authors[0])
+        tags = [Tag.objects.create(name=f'tag{i}', slug=f'tag{i}',
+                                   color='#FF0000') for i in range(3)]
+        ingredients = [Ingredient.objects.create(
+            name=f'ingredient{i}', measurement_unit='г') for i in range(5)]
+        for i in range(8):
+            recipe = Recipe.objects.create(
+                name=f'recipe{i}', text='text', cooking_time=i + 1,
+                author=authors[i % len(authors)])
+            recipe.tags.set(tags[:i % len(tags) + 1])
+            RecipeIngredient.objects.bulk_create(
+                RecipeIngredient(recipe=recipe, ingredient=ingredient,
+                                 amount=j + 1)
+                for j, ingredient in enumerate(ingredients[:i % 4 + 2]))
+            if i % 2:
+                Favorite.objects.create(user=cls.user, recipe=recipe)
+            if i % 3:
+                UserShoppingCart.objects.create(user=cls.user, recipe=recipe)
+
+    def assert_constant_queries(self, client, params=''):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(f'/api/recipes/?limit=2{params}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['results']), 2)
+        cache.clear()
+        with self.assertNumQueries(len(queries)):
+            response = client.get(f'/api/recipes/?limit=6{params}')
+        self.assertEqual(len(response.json()['results']), 6)
+
+    def test_anonymous(self):
+        self.assert_constant_queries(APIClient())
+
+    def test_authenticated(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        self.assert_constant_queries(client)
+
+    def test_full_representation(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        self.assert_constant_queries(client, '&expand=text,ingredients')
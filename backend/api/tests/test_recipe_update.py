@@ -0,0 +1,152 @@
+import base64
+import io
+import shutil
+import tempfile
+from unittest import mock
+
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
+from rest_framework.test import APIClient
+
+from recipes.models import Ingredient, Recipe, RecipeIngredient, Tag
+from users.models import User
+
+
+class RecipeUpdateTest(TestCase):
+    """PATCH рецепта меняет только разницу тегов и ингредиентов."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(
+            username='author', email='author@example.com')
+        cls.tags = [Tag.objects.create(name=f'tag{i}', slug=f'tag{i}',
+                                       color='#FF0000') for i in range(2)]
+        cls.ingredients = [Ingredient.objects.create(
+            name=f'ingredient{i}', measurement_unit='г') for i in range(3)]
+
+    def setUp(self):
+        self.recipe = Recipe.objects.create(
+            name='recipe', text='text', cooking_time=5, author=self.author,
+            ingredients_count=len(self.ingredients))
+        self.recipe.tags.set(self.tags)
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(recipe=self.recipe, ingredient=ingredient,
+                             amount=10)
+            for ingredient in self.ingredients)
+        self.client = APIClient()
+        self.client.force_authenticate(self.author)
+
+    def patch(self, data):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.patch(
+                f'/api/recipes/{self.recipe.id}/', data, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        return [query['sql'] for query in queries.captured_queries]
+
+    def writes(self, queries, table):
+        """Команды INSERT/UPDATE/DELETE, меняющие таблицу table."""
+        prefixes = {'INSERT': f'INSERT INTO "{table}"',
+                    'UPDATE': f'UPDATE "{table}"',
+                    'DELETE': f'DELETE FROM "{table}"'}
+        return [command for sql in queries
+                for command, prefix in prefixes.items()
+                if sql.startswith(prefix)]
+
+    def current_ingredients(self):
+        return dict(RecipeIngredient.objects.filter(
+            recipe=self.recipe).values_list('ingredient_id', 'amount'))
+
+    def test_one_amount_is_single_update(self):
+        rows = set(RecipeIngredient.objects.filter(
+            recipe=self.recipe).values_list('id', flat=True))
+        queries = self.patch({'ingredients': [
+            {'id': ingredient.id, 'amount': 20 if i == 0 else 10}
+            for i, ingredient in enumerate(self.ingredients)]})
+        self.assertEqual(
+            self.writes(queries, 'recipes_recipeingredient'), ['UPDATE'])
+        self.assertEqual(self.current_ingredients(), {
+            self.ingredients[0].id: 20,
+            self.ingredients[1].id: 10,
+            self.ingredients[2].id: 10,
+        })
+        self.assertEqual(rows, set(RecipeIngredient.objects.filter(
+            recipe=self.recipe).values_list('id', flat=True)))
+
+    def test_omitted_tags_and_ingredients_untouched(self):
+        before = self.current_ingredients()
+        queries = self.patch({'name': 'renamed'})
+        self.assertEqual(
+            self.writes(queries, 'recipes_recipeingredient'), [])
+        self.assertEqual(self.writes(queries, 'recipes_recipe_tags'), [])
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.name, 'renamed')
+        self.assertEqual(self.recipe.ingredients_count, len(before))
+        self.assertEqual(self.current_ingredients(), before)
+        self.assertCountEqual(self.recipe.tags.all(), self.tags)
+
+    def test_removed_ingredient_is_single_delete(self):
+        queries = self.patch({'ingredients': [
+            {'id': self.ingredients[0].id, 'amount': 10},
+            {'id': self.ingredients[1].id, 'amount': 10},
+        ]})
+        self.assertEqual(
+            self.writes(queries, 'recipes_recipeingredient'), ['DELETE'])
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.ingredients_count, 2)
+
+
+@override_settings(IMAGE_PROCESSING_WORKERS=0)
+class RecipeImageUpdateTest(TestCase):
+    """Возвращённая клиентом картинка рецепта не обрабатывается заново."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(
+            username='author', email='author@example.com')
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, True)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.recipe = Recipe.objects.create(
+            name='recipe', text='text', cooking_time=5, author=self.author)
+        self.client = APIClient()
+        self.client.force_authenticate(self.author)
+
+    def patch_image(self, content, mime_type):
+        encoded = base64.b64encode(content).decode()
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(
+                f'/api/recipes/{self.recipe.id}/',
+                {'image': f'data:{mime_type};base64,{encoded}'},
+                format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.recipe.refresh_from_db()
+
+    def test_served_image_sent_back_is_kept(self):
+        buffer = io.BytesIO()
+        Image.new('RGB', (40, 30), 'red').save(buffer, 'PNG')
+        self.patch_image(buffer.getvalue(), 'image/png')
+        image, thumb = self.recipe.image.name, self.recipe.image_thumb.name
+        self.assertTrue(image.endswith('.webp'))
+        self.assertTrue(thumb)
+        with self.recipe.image.open('rb') as file:
+            served = file.read()
+        with mock.patch(
+                'api.serializers.schedule_image_processing') as schedule:
+            self.patch_image(served, 'image/webp')
+        schedule.assert_not_called()
+        self.assertEqual(self.recipe.image.name, image)
+        self.assertEqual(self.recipe.image_thumb.name, thumb)
+
+    def test_image_in_target_format_not_reencoded(self):
+        buffer = io.BytesIO()
+        Image.new('RGB', (40, 30), 'red').save(buffer, 'WEBP')
+        self.patch_image(buffer.getvalue(), 'image/webp')
+        with self.recipe.image.open('rb') as file:
+            self.assertEqual(file.read(), buffer.getvalue())
+        self.assertTrue(self.recipe.image_thumb)
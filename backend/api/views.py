@@ -1,35 +1,61 @@
-from django.db.models import Sum
-from django.http import FileResponse, HttpResponse
+from django.conf import settings
+from django.db.models import OuterRef, Prefetch, Subquery, Sum, Value
+from django.http import HttpResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet
 from rest_framework import mixins, permissions, status, viewsets
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import (IsAdminUser, IsAuthenticated,
                                         IsAuthenticatedOrReadOnly)
 from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 
 from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
                             Tag, UserShoppingCart)
 from users.models import Following, User
+from .cache import AnonymousCacheMixin, CachedReferenceMixin
+from .feed import get_feed_ids
 from .filters import IngredientFilter, RecipeFilter
-from .pagination import CustomPagination
+from .pagination import (CachedCountPagination, IdCursorPagination,
+                         OptionalCursorPagination)
 from .permissions import IsAdminOrReadOnly, IsAuthorOrReadOnly
+from .renderers import SHOPPING_LIST_RENDERERS
+from .search import ingredient_index
 from .serializers import (CustomUserSerializer, FollowingSerializer,
                           IngredientSerializer, RecipeCreateSerializer,
-                          RecipeSerializer, TagSerializer)
-from .utils import create_report
+                          RecipeSerializer, TagSerializer,
+                          sparse_fields_context)
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(AnonymousCacheMixin, viewsets.ModelViewSet):
     """ViewSet для рецептов."""
 
     queryset = Recipe.objects.all()
     permission_classes = (IsAuthorOrReadOnly | IsAdminOrReadOnly,)
     serializer_class = RecipeCreateSerializer
-    pagination_class = CustomPagination
+    pagination_class = CachedCountPagination
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
+    cache_namespace = 'recipes'
+    # Действия, которые по умолчанию отдают краткое представление.
+    summary_actions = ('list', 'feed')
+
+    def get_queryset(self):
+        if self.request.method not in permissions.SAFE_METHODS:
+            # Ответ на запись перечитывается в RecipeCreateSerializer.
+            return Recipe.objects.all()
+        fields = set(RecipeSerializer(
+            context=self.get_serializer_context()).fields)
+        return Recipe.objects.with_user_data(self.request.user, fields)
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if self.request.method in permissions.SAFE_METHODS:
+            context.update(sparse_fields_context(
+                self.request, self.action in self.summary_actions))
+        return context
 
     def get_serializer_class(self):
         if self.request.method in permissions.SAFE_METHODS:
@@ -71,33 +97,78 @@ class RecipeViewSet(viewsets.ModelViewSet):
 
     @action(methods=('GET',), detail=False,
             permission_classes=[IsAuthenticated])
+    def feed(self, request):
+        """Рецепты авторов из подписок, новые первыми.
+
+        Следующая страница запрашивается по ссылке next (?before=<id>).
+        """
+        before = request.query_params.get('before', '')
+        before = int(before) if before.isdigit() else None
+        limit = request.query_params.get(
+            IdCursorPagination.page_size_query_param, '')
+        if limit.isdigit() and int(limit) > 0:
+            limit = min(int(limit), settings.FEED_CACHE_SIZE)
+        else:
+            limit = IdCursorPagination.page_size
+        ids = get_feed_ids(request.user, before, limit)
+        next_url = None
+        if len(ids) > limit:
+            ids = ids[:limit]
+            next_url = replace_query_param(
+                request.build_absolute_uri(), 'before', ids[-1])
+        recipes = self.get_queryset().filter(id__in=ids).order_by('-id')
+        serializer = RecipeSerializer(
+            recipes, many=True, context=self.get_serializer_context())
+        return Response({'next': next_url, 'results': serializer.data})
+
+    @action(methods=('GET',), detail=False,
+            permission_classes=[IsAuthenticated],
+            renderer_classes=SHOPPING_LIST_RENDERERS)
     def download_shopping_cart(self, request):
+        """Список покупок потоком в формате из ?format=txt|csv|json."""
         recipe_ingredients = RecipeIngredient.objects.filter(
             recipe__shopping_cart__user=request.user).values(
-            'ingredient__name').annotate(amount=Sum('amount'))
-        file_name = 'Shopping.txt'
-        create_report(recipe_ingredients, file_name)
-        return FileResponse(open(file_name, 'rb'), as_attachment=True)
+            'ingredient__name', 'ingredient__measurement_unit').annotate(
+            amount=Sum('amount')).order_by(
+            'ingredient__name', 'ingredient__measurement_unit')
+        renderer = request.accepted_renderer
+        response = StreamingHttpResponse(
+            renderer.stream(recipe_ingredients.iterator()),
+            content_type=f'{renderer.media_type}; charset=utf-8')
+        response['Content-Disposition'] = (
+            f'attachment; filename="shopping_list.{renderer.format}"')
+        return response
 
 
-class TagViewSet(mixins.ListModelMixin, mixins.RetrieveModelMixin,
-                 viewsets.GenericViewSet):
+class TagViewSet(CachedReferenceMixin, mixins.ListModelMixin,
+                 mixins.RetrieveModelMixin, viewsets.GenericViewSet):
     """ViewSet для тегов."""
 
     serializer_class = TagSerializer
     queryset = Tag.objects.all()
     permission_classes = (IsAdminOrReadOnly,)
+    cache_namespace = 'tags'
 
 
-class IngredientViewSet(mixins.ListModelMixin, mixins.RetrieveModelMixin,
-                        viewsets.GenericViewSet):
+class IngredientViewSet(CachedReferenceMixin, mixins.ListModelMixin,
+                        mixins.RetrieveModelMixin, viewsets.GenericViewSet):
     """ViewSet для ингредиентов."""
 
     serializer_class = IngredientSerializer
     queryset = Ingredient.objects.all()
     filter_backends = (IngredientFilter,)
-    search_fields = ('^name',)
     permission_classes = (IsAdminOrReadOnly,)
+    cache_namespace = 'ingredients'
+
+    def list(self, request, *args, **kwargs):
+        name = request.query_params.get(IngredientFilter.search_param, '')
+        if not name.strip():
+            return super().list(request, *args, **kwargs)
+        if not settings.INGREDIENTS_CACHE_TIMEOUT:
+            return super(CachedReferenceMixin, self).list(
+                request, *args, **kwargs)
+        return Response(ingredient_index.search(
+            name.strip(), settings.INGREDIENTS_SEARCH_LIMIT))
 
 
 class CustomUserViewSet(UserViewSet):
@@ -105,8 +176,37 @@ class CustomUserViewSet(UserViewSet):
 
     queryset = User.objects.all()
     serializer_class = CustomUserSerializer
-    pagination_class = CustomPagination
+    pagination_class = OptionalCursorPagination
     permission_classes = (IsAuthenticatedOrReadOnly,)
+    state_max_ids = 100
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if self.request.method in permissions.SAFE_METHODS:
+            context.update(sparse_fields_context(self.request))
+        return context
+
+    def get_subscriptions_queryset(self):
+        """Авторы, на которых подписан пользователь, с рецептами.
+
+        Число рецептов берётся из счётчика User.recipes_count, а
+        recipes_limit последних рецептов каждого автора выбираются одним
+        запросом через коррелированный подзапрос с LIMIT.
+        """
+        recipes = Recipe.objects.only('id', 'name', 'image', 'image_thumb',
+                                      'cooking_time', 'author')
+        limit_recipes = self.request.query_params.get('recipes_limit')
+        if limit_recipes is not None and limit_recipes.isdigit():
+            recipes = recipes.filter(id__in=Subquery(
+                Recipe.objects.filter(author=OuterRef('author')).values(
+                    'id')[:int(limit_recipes)]))
+        return User.objects.filter(
+            following__user=self.request.user
+        ).annotate(
+            is_subscribed=Value(True),
+        ).prefetch_related(
+            Prefetch('recipes', queryset=recipes, to_attr='limited_recipes')
+        ).order_by('-id')
 
     @action(methods=['POST', 'DELETE'],
             detail=True, )
@@ -117,20 +217,62 @@ class CustomUserViewSet(UserViewSet):
             user=user, following=following)
 
         if request.method == 'POST':
-            serializer = FollowingSerializer(following, context={
-                'request': request})
             Following.objects.create(user=user, following=following)
+            serializer = FollowingSerializer(
+                self.get_subscriptions_queryset().get(id=following.id),
+                context={'request': request})
             return Response(serializer.data, status=status.HTTP_201_CREATED)
 
         if request.method == 'DELETE':
             subscription.delete()
             return HttpResponse(status=status.HTTP_204_NO_CONTENT)
 
+    @action(detail=False, url_path='me/state',
+            permission_classes=[IsAuthenticated])
+    def state(self, request):
+        """Флаги пользователя для рецептов ?recipes= и авторов ?authors=.
+
+        Позволяет кэшировать общие данные рецептов для всех, а избранное,
+        список покупок и подписки запрашивать отдельно, по одному
+        запросу на каждый вид флагов.
+        """
+        recipes = self.get_ids_param('recipes')
+        authors = self.get_ids_param('authors')
+        user = request.user
+        favorited = set(user.favorite.filter(
+            recipe_id__in=recipes).values_list('recipe_id', flat=True)
+        ) if recipes else set()
+        in_shopping_cart = set(user.shopping_cart.filter(
+            recipe_id__in=recipes).values_list('recipe_id', flat=True)
+        ) if recipes else set()
+        subscribed = set(user.follower.filter(
+            following_id__in=authors).values_list('following_id', flat=True)
+        ) if authors else set()
+        return Response({
+            'recipes': {
+                pk: {'is_favorited': pk in favorited,
+                     'is_in_shopping_cart': pk in in_shopping_cart}
+                for pk in recipes
+            },
+            'authors': {
+                pk: {'is_subscribed': pk in subscribed} for pk in authors
+            },
+        })
+
+    def get_ids_param(self, name):
+        """Список id из параметра вида ?name=1,2,3."""
+        value = self.request.query_params.get(name, '')
+        ids = [pk.strip() for pk in value.split(',') if pk.strip()]
+        if not all(pk.isdigit() for pk in ids):
+            raise ValidationError({name: 'Ожидается список id через запятую.'})
+        if len(ids) > self.state_max_ids:
+            raise ValidationError(
+                {name: f'Не больше {self.state_max_ids} id.'})
+        return list(dict.fromkeys(map(int, ids)))
+
     @action(detail=False, permission_classes=[IsAuthenticated])
     def subscriptions(self, request):
-        user = request.user
-        list_of_following = User.objects.filter(following__user=user)
-        page = self.paginate_queryset(list_of_following)
+        page = self.paginate_queryset(self.get_subscriptions_queryset())
         serializer = FollowingSerializer(
             page, many=True,
             context={'request': request})
@@ -38,6 +38,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'api.middleware.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -97,6 +98,31 @@ else:
 #     }
 # }
 
+# Кэш, общий для воркеров и management-команд (import_csv сбрасывает
+# версии, cache_stats читает счётчики). Версии и счётчики меняются через
+# incr, поэтому нужен бэкенд с атомарным incr: Memcached (сервис cache
+# в docker-compose) по адресу CACHE_LOCATION. Без CACHE_LOCATION -
+# LocMemCache для разработки: он у каждого процесса свой.
+if os.getenv('CACHE_LOCATION'):
+    CACHES = {
+        'default': {
+            'BACKEND': os.getenv(
+                'CACHE_BACKEND',
+                'django.core.cache.backends.memcached.PyMemcacheCache'),
+            'LOCATION': os.getenv('CACHE_LOCATION'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Время жизни готовых ответов справочников (теги, ингредиенты).
+# С общим кэшем можно увеличить: версии сбрасываются сигналами.
+REFERENCE_CACHE_TIMEOUT = 60 * 5
+
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
 AUTH_USER_MODEL = 'users.User'
@@ -144,6 +170,17 @@ STATIC_ROOT = (BASE_DIR / 'static_backend')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = (BASE_DIR / 'media')
 
+# Обработка картинок рецептов: формат перекодирования, качество,
+# размер миниатюр и число фоновых потоков (0 - обработка в запросе).
+IMAGE_FORMAT = 'WEBP'
+IMAGE_QUALITY = 85
+IMAGE_THUMBNAIL_SIZE = (480, 480)
+IMAGE_PROCESSING_WORKERS = 2
+# Ограничения загружаемых картинок: размер файла и число пикселей
+# (защита от картинок-бомб при распаковке).
+IMAGE_MAX_SIZE = 10 * 1024 * 1024
+IMAGE_MAX_PIXELS = 40_000_000
+
 REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.AllowAny',
@@ -154,9 +191,66 @@ REST_FRAMEWORK = {
     'DEFAULT_FILTER_BACKENDS': [
         'django_filters.rest_framework.DjangoFilterBackend',
     ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'api.parsers.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
 
 }
 
+# Сжатие ответов (brotli, если установлен, иначе gzip): минимальный
+# размер ответа в байтах и качество brotli (0-11).
+COMPRESSION_MIN_SIZE = 1024
+COMPRESSION_BROTLI_QUALITY = 5
+
+# Кэш общего количества рецептов в пагинации (секунды) и размер
+# таблицы, начиная с которого для списка без фильтров берётся оценка
+# из статистики PostgreSQL вместо COUNT(*).
+PAGINATION_COUNT_CACHE_TIMEOUT = 30
+PAGINATION_COUNT_ESTIMATE_THRESHOLD = 100000
+
+# Кэш ответов списка и страниц рецептов для анонимных пользователей
+# (секунды) и max-age в Cache-Control для nginx и браузеров.
+RECIPES_CACHE_TIMEOUT = 60
+RECIPES_CACHE_MAX_AGE = 10
+
+# Раз в сколько секунд процесс добавляет накопленные попадания и промахи
+# кэша ответов к счётчикам в кэше (команда cache_stats).
+CACHE_STATS_FLUSH_INTERVAL = 10
+
+# Поиск ингредиентов: максимум результатов и время жизни кэша
+# таблицы ингредиентов в памяти процесса (0 - искать в БД).
+INGREDIENTS_SEARCH_LIMIT = 50
+INGREDIENTS_CACHE_TIMEOUT = 300
+
+# Популярность рецепта для ?ordering=popular: (избранное + вес * списки
+# покупок) / (часы с публикации + 2) ** GRAVITY. Пересчитывается
+# командой update_popularity.
+POPULARITY_CART_WEIGHT = 0.5
+POPULARITY_GRAVITY = 1.5
+
+# Лента /api/recipes/feed/: сколько последних id хранится в кэше на
+# пользователя и сколько секунд, число подписчиков автора, начиная с
+# которого его рецепты не раскладываются по лентам, а подмешиваются
+# при чтении, и число фоновых потоков раскладки (0 - в запросе).
+FEED_CACHE_SIZE = 500
+FEED_CACHE_TIMEOUT = 60 * 60
+FEED_FANOUT_MAX_FOLLOWERS = 1000
+FEED_FANOUT_WORKERS = 1
+
+# Подбор рецептов по имеющимся ингредиентам (?have=): сколько лучших
+# рецептов отдаётся, среди скольких лучших по индексу они ищутся при
+# других фильтрах и раз в сколько секунд обратный индекс в памяти
+# перечитывается целиком (между этим он обновляется по журналу).
+RECIPES_HAVE_LIMIT = 500
+RECIPES_HAVE_SCAN_LIMIT = 32000
+RECIPE_INDEX_CACHE_TIMEOUT = 60 * 60
+
 DJOSER = {
 
     "SERIALIZERS": {
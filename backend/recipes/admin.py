@@ -1,7 +1,10 @@
 from django.contrib import admin
+from django.db.models import Exists, OuterRef, Q
 
+from recipes.images import schedule_image_processing
 from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
                             Tag, UserShoppingCart)
+from recipes.search import search_recipes
 
 
 class RecipeIngredientsInline(admin.TabularInline):
@@ -12,15 +15,41 @@ class RecipeIngredientsInline(admin.TabularInline):
 class RecipeAdmin(admin.ModelAdmin):
     """Админка для модели рецептов."""
 
-    list_display = ('name', 'author', 'show_favorite_count')
+    list_display = ('name', 'author', 'show_favorite_count',
+                    'in_carts_count')
     list_filter = ('name', 'author', 'tags')
-    search_fields = ('name', 'author__username', 'tags__name')
+    search_fields = ('name',)
     filter_horizontal = ('tags',)
     inlines = (RecipeIngredientsInline,)
 
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        if 'image' in form.changed_data and obj.image:
+            schedule_image_processing(obj.id)
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        Recipe.objects.filter(id=form.instance.id).update(
+            ingredients_count=form.instance.ingredients_in_recipe.count())
+
+    def get_search_results(self, request, queryset, search_term):
+        """Полнотекстовый поиск, а также по началу логина автора и тега."""
+        search_term = search_term.strip()
+        if not search_term:
+            return queryset, False
+        found = search_recipes(queryset, search_term).order_by().values('pk')
+        tagged = Recipe.tags.through.objects.filter(
+            recipe=OuterRef('pk'), tag__name__istartswith=search_term)
+        return queryset.filter(
+            Q(pk__in=found)
+            | Q(author__username__istartswith=search_term)
+            | Q(Exists(tagged))
+        ), False
+
+    @admin.display(description='В избранном', ordering='favorites_count')
     def show_favorite_count(self, obj):
         """Общее число добавлений этого рецепта в избранное."""
-        return obj.favorite.count()
+        return obj.favorites_count
 
 
 class IngredientAdmin(admin.ModelAdmin):
@@ -0,0 +1,66 @@
+from django.apps import apps
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+# Модель и поле счётчика, модель и поле связи, по которым он считается.
+COUNTERS = (
+    ('recipes.Recipe', 'favorites_count', 'recipes.Favorite', 'recipe'),
+    ('recipes.Recipe', 'in_carts_count', 'recipes.UserShoppingCart',
+     'recipe'),
+    ('recipes.Recipe', 'ingredients_count', 'recipes.RecipeIngredient',
+     'recipe'),
+    ('users.User', 'recipes_count', 'recipes.Recipe', 'author'),
+    ('users.User', 'followers_count', 'users.Following', 'following'),
+)
+
+
+class UpdateOnlyFieldsMixin:
+    """Модель, поля update_only_fields которой полный save() не пишет.
+
+    Эти поля меняются отдельными UPDATE (change_counter, recount,
+    обработка картинок), и save() объекта, прочитанного раньше, вернул
+    бы старые значения. Записать их можно, только перечислив в
+    update_fields явно.
+    """
+
+    update_only_fields = ()
+
+    def save(self, force_insert=False, force_update=False, using=None,
+             update_fields=None):
+        if update_fields is None and not force_insert and (
+                not self._state.adding):
+            deferred = self.get_deferred_fields()
+            update_fields = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.update_only_fields
+                and field.attname not in deferred]
+        super().save(force_insert=force_insert, force_update=force_update,
+                     using=using, update_fields=update_fields)
+
+
+def change_counter(model, pk, field, delta):
+    """Изменить счётчик одним UPDATE, не опускаясь ниже нуля."""
+    model.objects.filter(pk=pk).update(
+        **{field: Greatest(F(field) + delta, 0)})
+
+
+def count_subquery(model, field):
+    """Число строк model, ссылающихся полем field на внешнюю запись."""
+    return Coalesce(Subquery(
+        model.objects.filter(**{field: OuterRef('pk')}).order_by().values(
+            field).annotate(count=Count('pk')).values('count')), 0)
+
+
+def recount(counters=COUNTERS):
+    """Пересчитать счётчики (по умолчанию все).
+
+    Обновляются только разошедшиеся строки, возвращается их число
+    по каждому счётчику.
+    """
+    fixed = {}
+    for label, field, related_label, related_field in counters:
+        actual = count_subquery(apps.get_model(related_label), related_field)
+        fixed[f'{label}.{field}'] = apps.get_model(label).objects.exclude(
+            **{field: actual}).update(**{field: actual})
+    return fixed
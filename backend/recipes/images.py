@@ -0,0 +1,103 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connections, transaction
+from PIL import Image, ImageOps
+
+from recipes.models import Recipe
+from recipes.signals import image_processed
+
+logger = logging.getLogger(__name__)
+
+Image.MAX_IMAGE_PIXELS = settings.IMAGE_MAX_PIXELS
+
+executor = ThreadPoolExecutor(
+    max_workers=max(settings.IMAGE_PROCESSING_WORKERS, 1),
+    thread_name_prefix='recipe-images',
+)
+
+
+def encode_image(image, size=None):
+    """Перекодировать картинку без метаданных, при size - уменьшить."""
+    image = ImageOps.exif_transpose(image)
+    if size is not None:
+        image.thumbnail(size)
+    if settings.IMAGE_FORMAT == 'JPEG' and image.mode != 'RGB':
+        image = image.convert('RGB')
+    elif image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA')
+    buffer = BytesIO()
+    image.save(buffer, format=settings.IMAGE_FORMAT,
+               quality=settings.IMAGE_QUALITY)
+    return buffer.getvalue()
+
+
+def is_encoded(image):
+    """Картинка уже в IMAGE_FORMAT и без метаданных.
+
+    Повторное сжатие такой картинки только ухудшило бы её.
+    """
+    return image.format == settings.IMAGE_FORMAT and not any(
+        key in image.info for key in ('exif', 'icc_profile', 'xmp'))
+
+
+def process_recipe_image(recipe_id):
+    """Перекодировать картинку рецепта и создать миниатюру.
+
+    Картинка, которая уже в нужном формате (is_encoded), остаётся
+    как есть. Поля обновляются через update(), только если картинка не
+    сменилась за время обработки, после чего отправляется
+    image_processed (сброс кэша ответов). Файлы могут использоваться
+    несколькими рецептами, поэтому старые не удаляются здесь, а
+    собираются командой collect_media.
+    """
+    recipe = Recipe.objects.filter(id=recipe_id).only('id', 'image').first()
+    if recipe is None or not recipe.image:
+        return
+    source_name = recipe.image.name
+    with recipe.image.open('rb') as file, Image.open(file) as image:
+        content = None if is_encoded(image) else encode_image(image)
+        thumbnail = encode_image(image, settings.IMAGE_THUMBNAIL_SIZE)
+    storage = recipe.image.storage
+    extension = settings.IMAGE_FORMAT.lower()
+    image_name = source_name
+    if content is not None:
+        image_name = storage.save(
+            f'recipes/image.{extension}', ContentFile(content))
+    thumbnail_name = storage.save(
+        f'recipes/thumbs/image.{extension}', ContentFile(thumbnail))
+    updated = Recipe.objects.filter(id=recipe_id, image=source_name).update(
+        image=image_name, image_thumb=thumbnail_name)
+    if updated:
+        image_processed.send(sender=Recipe, recipe_id=recipe_id)
+
+
+def process_recipe_image_logged(recipe_id):
+    try:
+        process_recipe_image(recipe_id)
+    except Exception:
+        logger.exception('Не удалось обработать картинку рецепта %s',
+                         recipe_id)
+
+
+def run_in_worker(recipe_id):
+    try:
+        process_recipe_image_logged(recipe_id)
+    finally:
+        connections.close_all()
+
+
+def schedule_image_processing(recipe_id):
+    """Обработать картинку после коммита транзакции.
+
+    При IMAGE_PROCESSING_WORKERS = 0 обработка идёт в текущем потоке.
+    """
+    if not settings.IMAGE_PROCESSING_WORKERS:
+        transaction.on_commit(
+            lambda: process_recipe_image_logged(recipe_id))
+    else:
+        transaction.on_commit(
+            lambda: executor.submit(run_in_worker, recipe_id))
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from recipes.images import process_recipe_image
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = 'Перекодирование картинок рецептов и создание миниатюр'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Обработать и рецепты, у которых уже есть миниатюра.')
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.exclude(
+            Q(image__isnull=True) | Q(image=''))
+        if not options['all']:
+            recipes = recipes.filter(
+                Q(image_thumb__isnull=True) | Q(image_thumb=''))
+        processed = failed = 0
+        for recipe_id in recipes.values_list('id', flat=True).iterator():
+            try:
+                process_recipe_image(recipe_id)
+            except Exception as error:
+                failed += 1
+                self.stderr.write(f'Рецепт {recipe_id}: {error}')
+                continue
+            processed += 1
+        self.stdout.write(f'Обработано {processed}, ошибок {failed}')
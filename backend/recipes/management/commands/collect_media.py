@@ -0,0 +1,62 @@
+import posixpath
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from django.utils import timezone
+
+from recipes.models import Recipe
+from recipes.storage import recipe_image_storage
+
+
+class Command(BaseCommand):
+    help = 'Удаление картинок рецептов, на которые нет ссылок в БД'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--grace', type=int, default=60,
+            help='Не трогать файлы моложе указанного числа минут.')
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только показать, что будет удалено.')
+
+    def handle(self, *args, **options):
+        referenced = set()
+        for names in Recipe.objects.values_list(
+                'image', 'image_thumb').iterator():
+            referenced.update(name for name in names if name)
+        threshold = timezone.now() - timedelta(minutes=options['grace'])
+        removed = size = 0
+        for name in self.walk(recipe_image_storage, 'recipes'):
+            if name in referenced or self.is_used(name, threshold):
+                continue
+            size += recipe_image_storage.size(name)
+            removed += 1
+            if options['dry_run']:
+                self.stdout.write(name)
+            else:
+                recipe_image_storage.delete(name)
+        self.stdout.write(
+            f'Используется файлов {len(referenced)}, удалено {removed} '
+            f'({size // 1024} КБ)')
+
+    def is_used(self, name, threshold):
+        """Файл свежий или на него уже ссылается рецепт.
+
+        Проверяется прямо перед удалением: список ссылок собран в начале
+        работы, а за это время файл мог снова загрузиться (storage
+        обновляет mtime) и попасть в новый рецепт.
+        """
+        if recipe_image_storage.get_modified_time(name) > threshold:
+            return True
+        return Recipe.objects.filter(
+            Q(image=name) | Q(image_thumb=name)).exists()
+
+    def walk(self, storage, path):
+        if not storage.exists(path):
+            return
+        directories, files = storage.listdir(path)
+        for name in files:
+            yield posixpath.join(path, name)
+        for directory in directories:
+            yield from self.walk(storage, posixpath.join(path, directory))
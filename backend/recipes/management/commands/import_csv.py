@@ -1,24 +1,160 @@
 import csv
-import os
+import json
+import time
+from itertools import islice
+from pathlib import Path
 
-from django.core.management.base import BaseCommand
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
 
-from recipes.models import Ingredient
+from recipes.models import Ingredient, Tag
+from recipes.signals import data_imported
+
+# Модель, поля ключа и поля, которые обновляются у существующих записей.
+IMPORTS = {
+    'ingredients': (Ingredient, ('name', 'measurement_unit'), ()),
+    'tags': (Tag, ('slug',), ('name', 'color')),
+}
+
+
+def read_csv(file):
+    yield from csv.DictReader(file, delimiter=',')
+
+
+def read_json(file, chunk_size=64 * 1024):
+    """Потоковое чтение json-массива объектов без загрузки файла целиком."""
+    decoder = json.JSONDecoder()
+    buffer = file.read(chunk_size).lstrip()
+    if not buffer.startswith('['):
+        raise CommandError('Ожидается json-массив объектов.')
+    buffer = buffer[1:]
+    while True:
+        buffer = buffer.lstrip().lstrip(',').lstrip()
+        if buffer.startswith(']'):
+            return
+        try:
+            row, end = decoder.raw_decode(buffer)
+        except json.JSONDecodeError:
+            chunk = file.read(chunk_size)
+            if not chunk:
+                raise CommandError('Некорректный json-файл.')
+            buffer += chunk
+            continue
+        yield row
+        buffer = buffer[end:]
+
+
+READERS = {
+    'csv': read_csv,
+    'json': read_json,
+}
 
 
 class Command(BaseCommand):
-    help = 'Заполнение БД данными из csv-файлов'
-
-    def handle(self, *args, **kwargs):
-        self.stdout.write('Импорт ингредиентов')
-        Ingredient.objects.all().delete()
-        print(os.getcwd())
-        with open('data/ingredients.csv', encoding='utf-8') as csv_file:
-            csv_reader = csv.DictReader(csv_file, delimiter=',')
-            line_count = 0
-            for row in csv_reader:
-                category = Ingredient(name=row['name'],
-                                      measurement_unit=row['measurement_unit'])
-                category.save()
-                line_count += 1
-        self.stdout.write('Добавлено строк %s' % line_count)
+    help = 'Заполнение БД ингредиентами и тегами из csv/json-файлов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--model', choices=(*IMPORTS, 'all'), default='all',
+            help='Что импортировать (по умолчанию всё).')
+        parser.add_argument(
+            '--path', type=Path, default=settings.BASE_DIR / 'data',
+            help='Файл или каталог с файлами <model>.<format>.')
+        parser.add_argument(
+            '--format', choices=READERS, default=None,
+            help='Формат файла (по умолчанию по расширению или csv).')
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Количество строк в одном запросе к БД.')
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Посчитать изменения и откатить транзакцию.')
+
+    def handle(self, *args, **options):
+        names = list(IMPORTS) if options['model'] == 'all' else [
+            options['model']]
+        path = options['path']
+        if path.is_file() and len(names) > 1:
+            raise CommandError('Для файла укажите --model.')
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size должен быть больше нуля.')
+        started = time.monotonic()
+        with transaction.atomic():
+            for name in names:
+                file_format = options['format']
+                file_path = path
+                if path.is_dir():
+                    file_path = path / f'{name}.{file_format or "csv"}'
+                if file_format is None:
+                    file_format = file_path.suffix.lstrip('.') or 'csv'
+                if file_format not in READERS:
+                    raise CommandError(f'Неизвестный формат {file_format}.')
+                if not file_path.is_file():
+                    raise CommandError(f'Файл {file_path} не найден.')
+                self.stdout.write(f'Импорт {name} из {file_path}')
+                with open(file_path, encoding='utf-8') as file:
+                    inserted, updated, skipped = self.import_rows(
+                        *IMPORTS[name], READERS[file_format](file),
+                        options['batch_size'])
+                self.stdout.write(
+                    f'Добавлено {inserted}, обновлено {updated}, '
+                    f'пропущено {skipped}')
+            if options['dry_run']:
+                transaction.set_rollback(True)
+                self.stdout.write('Пробный запуск, изменения отменены')
+        if not options['dry_run']:
+            for name in names:
+                data_imported.send(sender=IMPORTS[name][0])
+            if isinstance(caches['default'], LocMemCache):
+                self.stderr.write(self.style.WARNING(
+                    'Кэш в памяти процесса (LocMemCache): веб-воркеры '
+                    'увидят новые данные только через '
+                    'REFERENCE_CACHE_TIMEOUT секунд.'))
+        self.stdout.write(
+            'Время импорта %.2f с' % (time.monotonic() - started))
+
+    def import_rows(self, model, key_fields, update_fields, rows,
+                    batch_size):
+        fields = (*key_fields, *update_fields)
+        inserted = updated = skipped = 0
+        rows = iter(rows)
+        while True:
+            batch = list(islice(rows, batch_size))
+            if not batch:
+                return inserted, updated, skipped
+            objects = {}
+            for row in batch:
+                values = {field: str(row.get(field) or '').strip()
+                          for field in fields}
+                key = tuple(values[field] for field in key_fields)
+                if not all(key) or key in objects:
+                    skipped += 1
+                    continue
+                objects[key] = model(**values)
+            existing = {
+                tuple(getattr(obj, field) for field in key_fields): obj
+                for obj in model.objects.filter(**{
+                    f'{key_fields[0]}__in': {key[0] for key in objects}})
+            }
+            to_create, to_update = [], []
+            for key, obj in objects.items():
+                current = existing.get(key)
+                if current is None:
+                    to_create.append(obj)
+                    continue
+                changed = [field for field in update_fields
+                           if getattr(current, field) != getattr(obj, field)]
+                if not changed:
+                    skipped += 1
+                    continue
+                for field in changed:
+                    setattr(current, field, getattr(obj, field))
+                to_update.append(current)
+            model.objects.bulk_create(to_create)
+            if to_update:
+                model.objects.bulk_update(to_update, update_fields)
+            inserted += len(to_create)
+            updated += len(to_update)
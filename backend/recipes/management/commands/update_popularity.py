@@ -0,0 +1,51 @@
+import time
+
+from apscheduler.schedulers.blocking import BlockingScheduler
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+from django.utils import timezone
+
+from recipes.ranking import update_popularity
+
+
+class Command(BaseCommand):
+    help = 'Пересчёт популярности рецептов (один раз или по расписанию)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--every', type=int, default=None, metavar='MINUTES',
+            help='Запускать пересчёт каждые MINUTES минут.')
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Количество рецептов в одном запросе к БД.')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size должен быть больше нуля.')
+        if options['every'] is None:
+            self.run(options['batch_size'])
+            return
+        if options['every'] < 1:
+            raise CommandError('--every должен быть больше нуля.')
+        scheduler = BlockingScheduler(timezone=settings.TIME_ZONE)
+        scheduler.add_job(
+            self.run, 'interval', args=(options['batch_size'],),
+            minutes=options['every'], next_run_time=timezone.now(),
+            max_instances=1, coalesce=True)
+        self.stdout.write(
+            f'Пересчёт популярности каждые {options["every"]} мин')
+        try:
+            scheduler.start()
+        except (KeyboardInterrupt, SystemExit):
+            pass
+
+    def run(self, batch_size):
+        close_old_connections()
+        started = time.monotonic()
+        try:
+            updated = update_popularity(batch_size)
+        finally:
+            close_old_connections()
+        self.stdout.write('Популярность обновлена у %d рецептов за %.2f с'
+                          % (updated, time.monotonic() - started))
@@ -0,0 +1,37 @@
+from django.db import migrations
+
+# Индексы под UPPER("name"::text) LIKE UPPER(...), который Django строит
+# для istartswith/icontains на PostgreSQL. На SQLite поиск идёт через
+# кэш ингредиентов в памяти, индексы не создаются.
+POSTGRES_INDEXES = (
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    'CREATE INDEX IF NOT EXISTS recipes_ingredient_name_upper_like '
+    'ON recipes_ingredient (UPPER(name::text) text_pattern_ops)',
+    'CREATE INDEX IF NOT EXISTS recipes_ingredient_name_upper_trgm '
+    'ON recipes_ingredient USING gin (UPPER(name::text) gin_trgm_ops)',
+)
+POSTGRES_DROP_INDEXES = (
+    'DROP INDEX IF EXISTS recipes_ingredient_name_upper_like',
+    'DROP INDEX IF EXISTS recipes_ingredient_name_upper_trgm',
+)
+
+
+def run_postgres_sql(statements):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != 'postgresql':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0008_auto_20230703_1813'),
+    ]
+
+    operations = [
+        migrations.RunPython(run_postgres_sql(POSTGRES_INDEXES),
+                             run_postgres_sql(POSTGRES_DROP_INDEXES)),
+    ]
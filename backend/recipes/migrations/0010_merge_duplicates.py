@@ -0,0 +1,58 @@
+from django.db import migrations
+from django.db.models import Count, Min, Sum
+
+
+def remove_duplicates(apps, schema_editor):
+    """Схлопнуть дубликаты перед добавлением уникальных ограничений."""
+    Ingredient = apps.get_model('recipes', 'Ingredient')
+    RecipeIngredient = apps.get_model('recipes', 'RecipeIngredient')
+    Tag = apps.get_model('recipes', 'Tag')
+    Recipe = apps.get_model('recipes', 'Recipe')
+
+    duplicates = Ingredient.objects.values(
+        'name', 'measurement_unit').annotate(
+        keep_id=Min('id'), total=Count('id')).filter(total__gt=1)
+    for duplicate in duplicates:
+        extra = Ingredient.objects.filter(
+            name=duplicate['name'],
+            measurement_unit=duplicate['measurement_unit'],
+        ).exclude(id=duplicate['keep_id'])
+        RecipeIngredient.objects.filter(ingredient__in=extra).update(
+            ingredient_id=duplicate['keep_id'])
+        extra.delete()
+
+    duplicates = RecipeIngredient.objects.values(
+        'recipe', 'ingredient').annotate(
+        keep_id=Min('id'), total=Count('id'),
+        amount_sum=Sum('amount')).filter(total__gt=1)
+    for duplicate in duplicates:
+        RecipeIngredient.objects.filter(id=duplicate['keep_id']).update(
+            amount=min(duplicate['amount_sum'], 32767))
+        RecipeIngredient.objects.filter(
+            recipe=duplicate['recipe'], ingredient=duplicate['ingredient'],
+        ).exclude(id=duplicate['keep_id']).delete()
+
+    duplicates = Tag.objects.values('slug').annotate(
+        keep_id=Min('id'), total=Count('id')).filter(total__gt=1)
+    for duplicate in duplicates:
+        extra = Tag.objects.filter(
+            slug=duplicate['slug']).exclude(id=duplicate['keep_id'])
+        for recipe in Recipe.objects.filter(tags__in=extra).distinct():
+            recipe.tags.add(duplicate['keep_id'])
+        extra.delete()
+
+
+class Migration(migrations.Migration):
+    """Схлопнуть дубликаты до 0010_indexes_and_constraints.
+
+    Отдельная миграция: на PostgreSQL изменение строк и ALTER TABLE
+    в одной транзакции падают из-за отложенных проверок внешних ключей.
+    """
+
+    dependencies = [
+        ('recipes', '0009_ingredient_name_search_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicates, migrations.RunPython.noop),
+    ]
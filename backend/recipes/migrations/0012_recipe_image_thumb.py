@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0011_indexes_and_constraints'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='image_thumb',
+            field=models.ImageField(blank=True, editable=False, null=True, upload_to='recipes/thumbs/', verbose_name='Миниатюра'),
+        ),
+    ]
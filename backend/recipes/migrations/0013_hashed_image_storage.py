@@ -0,0 +1,22 @@
+from django.db import migrations, models
+import recipes.storage
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0012_recipe_image_thumb'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='recipe',
+            name='image',
+            field=models.ImageField(blank=True, null=True, storage=recipes.storage.HashedFileSystemStorage(), upload_to='recipes/'),
+        ),
+        migrations.AlterField(
+            model_name='recipe',
+            name='image_thumb',
+            field=models.ImageField(blank=True, editable=False, null=True, storage=recipes.storage.HashedFileSystemStorage(), upload_to='recipes/thumbs/', verbose_name='Миниатюра'),
+        ),
+    ]
@@ -0,0 +1,45 @@
+import django.contrib.postgres.search
+from django.db import migrations
+
+# GIN-индекс и заполнение search_vector только на PostgreSQL, на SQLite
+# поиск рецептов идёт через icontains.
+POSTGRES_SQL = (
+    'CREATE INDEX IF NOT EXISTS recipes_recipe_search_vector_gin '
+    'ON recipes_recipe USING gin (search_vector)',
+    "UPDATE recipes_recipe r SET search_vector = "
+    "setweight(to_tsvector('russian', coalesce(r.name, '')), 'A') || "
+    "setweight(to_tsvector('russian', coalesce(r.text, '')), 'B') || "
+    "setweight(to_tsvector('russian', coalesce(("
+    "SELECT string_agg(i.name, ' ') FROM recipes_recipeingredient ri "
+    "JOIN recipes_ingredient i ON i.id = ri.ingredient_id "
+    "WHERE ri.recipe_id = r.id), '')), 'C')",
+)
+POSTGRES_DROP_SQL = (
+    'DROP INDEX IF EXISTS recipes_recipe_search_vector_gin',
+)
+
+
+def run_postgres_sql(statements):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != 'postgresql':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0015_recipe_popularity'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(run_postgres_sql(POSTGRES_SQL),
+                             run_postgres_sql(POSTGRES_DROP_SQL)),
+    ]
@@ -0,0 +1,36 @@
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_ingredients_count(apps, schema_editor):
+    counts = apps.get_model('recipes', 'RecipeIngredient').objects.filter(
+        recipe=OuterRef('pk')).order_by().values('recipe').annotate(
+        count=Count('pk')).values('count')
+    apps.get_model('recipes', 'Recipe').objects.update(
+        ingredients_count=Coalesce(Subquery(counts), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0016_recipe_search_vector'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='ingredients_count',
+            field=models.PositiveSmallIntegerField(default=0, editable=False, verbose_name='Количество ингредиентов'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['ingredients_count', '-id'], name='recipe_ingredients_count_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['author', 'cooking_time'], name='recipe_author_cooking_time_idx'),
+        ),
+        migrations.RunPython(fill_ingredients_count,
+                             migrations.RunPython.noop),
+    ]
@@ -1,10 +1,19 @@
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MinValueValidator
 from django.db import models
-from django.db.models import UniqueConstraint
+from django.db.models import (Exists, OuterRef, Prefetch, UniqueConstraint,
+                              Value)
+
+from recipes.counters import UpdateOnlyFieldsMixin
+from recipes.storage import recipe_image_storage
 
 User = get_user_model()
 
+# Поля ответа, для которых with_user_data готовит данные.
+USER_DATA_FIELDS = ('text', 'author', 'tags', 'ingredients', 'is_favorited',
+                    'is_in_shopping_cart')
+
 
 class Ingredient(models.Model):
     """Модель ингредиентов."""
@@ -14,6 +23,13 @@ class Ingredient(models.Model):
     measurement_unit = models.CharField(max_length=250,
                                         verbose_name='Единицы измерения')
 
+    class Meta:
+        constraints = [
+            UniqueConstraint(
+                fields=['name', 'measurement_unit'], name='unique_ingredient'
+            )
+        ]
+
     def __str__(self):
         return self.name
 
@@ -23,14 +39,57 @@ class Tag(models.Model):
 
     name = models.CharField(max_length=250,
                             verbose_name='Тег')
-    slug = models.SlugField(max_length=50)
+    slug = models.SlugField(max_length=50, unique=True)
     color = models.CharField(max_length=50)
 
     def __str__(self):
         return self.name
 
 
-class Recipe(models.Model):
+class RecipeQuerySet(models.QuerySet):
+    """Queryset рецептов с данными для сериализации."""
+
+    def with_user_data(self, user, fields=None):
+        """Флаги пользователя и связанные объекты без запросов на строку.
+
+        fields - имена полей ответа, если нужны не все: флаги,
+        связанные объекты и описание для остальных не запрашиваются.
+        """
+        if fields is None:
+            fields = USER_DATA_FIELDS
+        queryset = self.defer('search_vector')
+        if 'text' not in fields:
+            queryset = queryset.defer('text')
+        for name, related in (('is_favorited', 'favorite'),
+                              ('is_in_shopping_cart', 'shopping_cart')):
+            if name not in fields:
+                continue
+            if user.is_authenticated:
+                value = Exists(getattr(user, related).filter(
+                    recipe=OuterRef('pk')))
+            else:
+                value = Value(False)
+            queryset = queryset.annotate(**{name: value})
+        if 'author' in fields:
+            authors = User.objects.all()
+            if user.is_authenticated:
+                authors = authors.annotate(is_subscribed=Exists(
+                    user.follower.filter(following=OuterRef('pk'))))
+            else:
+                authors = authors.annotate(is_subscribed=Value(False))
+            queryset = queryset.prefetch_related(
+                Prefetch('author', queryset=authors))
+        if 'tags' in fields:
+            queryset = queryset.prefetch_related('tags')
+        if 'ingredients' in fields:
+            queryset = queryset.prefetch_related(
+                Prefetch('ingredients_in_recipe',
+                         queryset=RecipeIngredient.objects.select_related(
+                             'ingredient')))
+        return queryset
+
+
+class Recipe(UpdateOnlyFieldsMixin, models.Model):
     """Модель рецептов."""
 
     name = models.CharField(max_length=250,
@@ -45,7 +104,12 @@ class Recipe(models.Model):
                                          related_name='recipes',
                                          verbose_name='Ингредиент',
                                          through='RecipeIngredient')
-    image = models.ImageField(upload_to='recipes/', null=True, blank=True)
+    image = models.ImageField(upload_to='recipes/', null=True, blank=True,
+                              storage=recipe_image_storage)
+    image_thumb = models.ImageField(upload_to='recipes/thumbs/',
+                                    null=True, blank=True, editable=False,
+                                    storage=recipe_image_storage,
+                                    verbose_name='Миниатюра')
     cooking_time = models.IntegerField(
         verbose_name='Время приготовления в минутах',
         default=1,
@@ -55,9 +119,42 @@ class Recipe(models.Model):
     tags = models.ManyToManyField(Tag,
                                   related_name='recipes',
                                   verbose_name='Теги')
+    favorites_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name='В избранном')
+    in_carts_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name='В списках покупок')
+    ingredients_count = models.PositiveSmallIntegerField(
+        default=0, editable=False, verbose_name='Количество ингредиентов')
+    pub_date = models.DateTimeField(auto_now_add=True,
+                                    verbose_name='Дата публикации')
+    popularity = models.FloatField(default=0, editable=False,
+                                   verbose_name='Популярность')
+    # Заполняется recipes.search.update_search_vectors только на
+    # PostgreSQL, GIN-индекс создаётся в миграции.
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    objects = RecipeQuerySet.as_manager()
+
+    update_only_fields = ('favorites_count', 'in_carts_count',
+                          'ingredients_count', 'popularity', 'image_thumb',
+                          'search_vector')
 
     class Meta:
         ordering = ['-id']
+        indexes = [
+            models.Index(fields=['author', '-id'],
+                         name='recipe_author_id_idx'),
+            models.Index(fields=['-favorites_count', '-id'],
+                         name='recipe_favorites_count_idx'),
+            models.Index(fields=['-popularity', '-id'],
+                         name='recipe_popularity_idx'),
+            models.Index(fields=['cooking_time', '-id'],
+                         name='recipe_cooking_time_idx'),
+            models.Index(fields=['ingredients_count', '-id'],
+                         name='recipe_ingredients_count_idx'),
+            models.Index(fields=['author', 'cooking_time'],
+                         name='recipe_author_cooking_time_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -75,6 +172,14 @@ class RecipeIngredient(models.Model):
         verbose_name='Количество',
         validators=[MinValueValidator(1)])
 
+    class Meta:
+        constraints = [
+            UniqueConstraint(
+                fields=['recipe', 'ingredient'],
+                name='unique_recipe_ingredient'
+            )
+        ]
+
 
 class Favorite(models.Model):
     """Любимые рецепты."""
@@ -96,6 +201,10 @@ class Favorite(models.Model):
                 fields=['user', 'recipe'], name='unique_favorite'
             )
         ]
+        indexes = [
+            models.Index(fields=['recipe', 'user'],
+                         name='favorite_recipe_user_idx'),
+        ]
 
 
 class UserShoppingCart(models.Model):
@@ -120,3 +229,7 @@ class UserShoppingCart(models.Model):
                 fields=['user', 'recipe'], name='unique_shopping_cart'
             )
         ]
+        indexes = [
+            models.Index(fields=['recipe', 'user'],
+                         name='shopping_cart_recipe_user_idx'),
+        ]
@@ -0,0 +1,39 @@
+from django.conf import settings
+from django.utils import timezone
+
+from recipes.models import Recipe
+
+
+def popularity(favorites_count, in_carts_count, age_hours):
+    """Популярность с затуханием по возрасту рецепта."""
+    score = favorites_count + settings.POPULARITY_CART_WEIGHT * in_carts_count
+    return score / (age_hours + 2) ** settings.POPULARITY_GRAVITY
+
+
+def update_popularity(batch_size=1000):
+    """Пересчитать Recipe.popularity, вернуть число изменённых рецептов.
+
+    Счёт берётся из счётчиков избранного и списков покупок, поэтому
+    таблицы связей не агрегируются. Записываются только изменившиеся
+    значения, рецепты без добавлений остаются с нулём.
+    """
+    now = timezone.now()
+    recipes = Recipe.objects.order_by().values_list(
+        'id', 'pub_date', 'favorites_count', 'in_carts_count', 'popularity')
+    changed = []
+    updated = 0
+    for pk, pub_date, favorites, in_carts, current in recipes.iterator(
+            chunk_size=batch_size):
+        age_hours = max((now - pub_date).total_seconds() / 3600, 0)
+        score = popularity(favorites, in_carts, age_hours)
+        if score == current:
+            continue
+        changed.append(Recipe(id=pk, popularity=score))
+        if len(changed) >= batch_size:
+            Recipe.objects.bulk_update(changed, ['popularity'])
+            updated += len(changed)
+            changed = []
+    if changed:
+        Recipe.objects.bulk_update(changed, ['popularity'])
+        updated += len(changed)
+    return updated
@@ -0,0 +1,61 @@
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                            SearchVector)
+from django.db import connection
+from django.db.models import (Case, Exists, F, IntegerField, OuterRef, Q,
+                              Subquery, Value, When)
+from django.db.models.functions import Coalesce
+
+from recipes.models import Recipe, RecipeIngredient
+
+SEARCH_CONFIG = 'russian'
+
+
+def ingredient_names():
+    """Названия ингредиентов рецепта одной строкой (подзапрос)."""
+    return Coalesce(Subquery(
+        RecipeIngredient.objects.filter(recipe=OuterRef('pk')).order_by(
+        ).values('recipe').annotate(
+            names=StringAgg('ingredient__name', ' ')).values('names')),
+        Value(''))
+
+
+def update_search_vectors(recipes=None):
+    """Пересчитать Recipe.search_vector одним UPDATE.
+
+    Вес A - название, B - описание, C - ингредиенты. На других СУБД
+    столбец не заполняется, поиск идёт через icontains.
+    """
+    if connection.vendor != 'postgresql':
+        return 0
+    if recipes is None:
+        recipes = Recipe.objects.all()
+    return recipes.update(search_vector=(
+        SearchVector('name', weight='A', config=SEARCH_CONFIG)
+        + SearchVector('text', weight='B', config=SEARCH_CONFIG)
+        + SearchVector(ingredient_names(), weight='C', config=SEARCH_CONFIG)
+    ))
+
+
+def search_recipes(queryset, text):
+    """Рецепты по тексту в названии, описании и ингредиентах.
+
+    На PostgreSQL - полнотекстовый поиск по search_vector (GIN-индекс)
+    с сортировкой по рангу, иначе - icontains, сначала совпадения
+    в названии.
+    """
+    if connection.vendor == 'postgresql':
+        query = SearchQuery(text, config=SEARCH_CONFIG,
+                            search_type='websearch')
+        return queryset.filter(search_vector=query).annotate(
+            search_rank=SearchRank(F('search_vector'), query),
+        ).order_by('-search_rank', '-id')
+    in_ingredients = Exists(RecipeIngredient.objects.filter(
+        recipe=OuterRef('pk'), ingredient__name__icontains=text))
+    return queryset.filter(
+        Q(name__icontains=text) | Q(text__icontains=text) | in_ingredients
+    ).annotate(search_rank=Case(
+        When(name__icontains=text, then=Value(1)),
+        default=Value(0),
+        output_field=IntegerField(),
+    )).order_by('-search_rank', '-id')
@@ -0,0 +1,8 @@
+from django.dispatch import Signal
+
+# Отправляется import_csv после загрузки данных модели sender.
+data_imported = Signal()
+
+# Отправляется после обработки картинки рецепта (recipes.images):
+# поля image и image_thumb меняются через update() без post_save.
+image_processed = Signal()
@@ -0,0 +1,49 @@
+import hashlib
+import os
+import posixpath
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+@deconstructible
+class HashedFileSystemStorage(FileSystemStorage):
+    """Хранилище, которое называет файлы по хэшу содержимого.
+
+    Файл сохраняется как <каталог>/<2 символа хэша>/<хэш>.<расширение>,
+    повторная запись того же содержимого возвращает имя существующего
+    файла и обновляет его mtime, чтобы collect_media не удалил его как
+    старый. Файлы не перезаписываются, поэтому их можно отдавать с
+    бессрочным кэшированием; лишние удаляет команда collect_media.
+    """
+
+    def hashed_name(self, name, content):
+        """Имя, под которым save() сохранит content."""
+        digest = hashlib.sha256()
+        content.seek(0)
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+        digest = digest.hexdigest()
+        return posixpath.join(
+            posixpath.dirname(name), digest[:2],
+            digest + posixpath.splitext(name)[1].lower())
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.hashed_name(name, content)
+        if self.exists(name):
+            try:
+                os.utime(self.path(name))
+                return name
+            except FileNotFoundError:
+                # Удалён collect_media после проверки - записываем заново.
+                pass
+        return super().save(name, content, max_length)
+
+
+recipe_image_storage = HashedFileSystemStorage()
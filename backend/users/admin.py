@@ -6,7 +6,8 @@ from .models import Following, User
 class UserAdmin(admin.ModelAdmin):
     """Админка для пользователей."""
 
-    list_display = ('id', 'email', 'username', 'first_name', 'last_name',)
+    list_display = ('id', 'email', 'username', 'first_name', 'last_name',
+                    'recipes_count', 'followers_count')
     list_filter = ('email', 'username')
     search_fields = ('email', 'username')
 
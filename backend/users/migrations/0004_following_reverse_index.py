@@ -0,0 +1,15 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_auto_20230701_2348'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='following',
+            index=models.Index(fields=['following', 'user'], name='following_following_user_idx'),
+        ),
+    ]
@@ -2,8 +2,10 @@ from django.contrib.auth.models import AbstractUser
 from django.db import models
 from django.db.models import UniqueConstraint
 
+from recipes.counters import UpdateOnlyFieldsMixin
 
-class User(AbstractUser):
+
+class User(UpdateOnlyFieldsMixin, AbstractUser):
     email = models.EmailField(unique=True,
                               verbose_name='email adress',
                               max_length=254,)
@@ -16,6 +18,12 @@ class User(AbstractUser):
                                  verbose_name='фамилия пользователя',)
     password = models.CharField(max_length=150,
                                 verbose_name='пароль',)
+    recipes_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name='количество рецептов',)
+    followers_count = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name='количество подписчиков',)
+
+    update_only_fields = ('recipes_count', 'followers_count')
 
 
 class Following(models.Model):
@@ -38,3 +46,7 @@ class Following(models.Model):
                 fields=['user', 'following'], name='unique_following'
             )
         ]
+        indexes = [
+            models.Index(fields=['following', 'user'],
+                         name='following_following_user_idx'),
+        ]